@@ -1,61 +1,201 @@
 #!/usr/bin/env python3
 import datetime
+import functools
+import hashlib
 import ipaddress
+import json
+import logging
+import os
 import pickle
+import sqlite3
+from contextlib import asynccontextmanager
 
+import httpx
 import redis.asyncio as redis
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.templating import Jinja2Templates
-from starlette.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+import archive
+import cache
+import nextbikes
+import profiling
+import public_transport
+import refresh_worker
+import static_files
 
 # from werkzeug.middleware.proxy_fix import ProxyFix
 # from flask_redis import FlaskRedis
 from lunches import gather_restaurants
-from public_transport import public_transport_connections
+from recording import transport_from_env
+
+STATIC_DIR = os.environ.get("STATIC_DIR", "static")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+DIRECTION_PATTERN = f"^({'|'.join(public_transport.DIRECTIONS)})$"
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging():
+    # fastapi run configures only the uvicorn loggers, the root logger has no handler and stays at WARNING
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("[%(asctime)s] %(levelname)s %(name)s - %(message)s"))
+    for name in (__name__, "cache", "profiling"):
+        log = logging.getLogger(name)
+        log.setLevel(LOG_LEVEL)
+        if not log.handlers:
+            log.addHandler(handler)
+        log.propagate = False
+
+
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # built frontend is served from memory, compressed once
+    app.state.static = static_files.load(STATIC_DIR)
+    # client shared by the endpoints proxying upstream APIs
+    async with httpx.AsyncClient(timeout=15, transport=transport_from_env()) as http:
+        app.state.http = http
+        # cached values, served from a local fallback while redis is down
+        app.state.kv = cache.from_env()
+        try:
+            yield
+        finally:
+            await app.state.kv.close()
+            await redis_client.aclose()
 
-app = FastAPI(debug=True)
+
+app = FastAPI(debug=True, lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
+templates.env.filters["strftime"] = lambda ts, fmt: datetime.datetime.fromtimestamp(ts).strftime(fmt)
 # app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1)
-redis_client = redis.Redis()
+# refresh worker streams, the blocking reads for the results need a longer socket timeout than the cache
+redis_client = redis.Redis.from_url(
+    os.environ.get("REDIS_URL", "redis://localhost"),
+    socket_timeout=refresh_worker.POLL_INTERVAL + cache.REDIS_TIMEOUT,
+    socket_connect_timeout=cache.REDIS_TIMEOUT,
+)
+
+
+def etag_response(request, body, media_type):
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def static_response(request, path):
+    f = request.app.state.static.get(path)
+    if not f:
+        raise HTTPException(status_code=404)
+    return static_files.response(request, f)
 
 
 @app.get("/")
-def index():
-    return FileResponse("index.html")
+def index(request: Request):
+    return static_response(request, "index.html")
 
 
-@app.get("/public_transport")
-async def public_transport(request: Request):
-    srcs = ["Václava Jiřikovského"]
-    dsts = ["Hlavní třída", "Rektorát VŠB", "Pustkovecká", "Poruba,Studentské koleje"]
-    if datetime.datetime.now().hour >= 12:
-        srcs, dsts = dsts, srcs
-
-    return templates.TemplateResponse(
-        request=request,
-        name="public_transport.html",
-        context={"connections": await public_transport_connections(srcs, dsts)},
+@app.get("/assets/{path:path}")
+def assets(request: Request, path: str):
+    return static_response(request, f"{static_files.IMMUTABLE_DIR}/{path}")
+
+
+@app.get("/nextbikes.json")
+async def nextbikes_json(request: Request):
+    try:
+        body = await nextbikes.nextbikes_snapshot(request.app.state.kv, request.app.state.http)
+    except nextbikes.FEED_ERRORS as e:
+        # there's no earlier snapshot to serve
+        raise HTTPException(status_code=502, detail="Nextbike feed unavailable") from e
+    return etag_response(request, body, "application/json")
+
+
+async def public_transport_snapshot(request, route_set, direction):
+    if route_set not in public_transport.ROUTE_SETS:
+        raise HTTPException(status_code=404, detail="Unknown route set")
+    return await public_transport.connections_snapshot(
+        request.app.state.kv, request.app.state.http, route_set, direction or public_transport.default_direction()
     )
 
 
+@functools.lru_cache(maxsize=16)
+def render_public_transport(snapshot):
+    connections = json.loads(snapshot)["connections"]
+    return templates.get_template("public_transport.html").render(connections=connections).encode()
+
+
+@app.get("/public_transport.json")
+async def public_transport_json(
+    request: Request,
+    route_set: str = public_transport.DEFAULT_ROUTE_SET,
+    direction: str = Query(None, pattern=DIRECTION_PATTERN),
+):
+    body = await public_transport_snapshot(request, route_set, direction)
+    return etag_response(request, body, "application/json")
+
+
+@app.get("/public_transport")
+async def public_transport_html(
+    request: Request,
+    route_set: str = public_transport.DEFAULT_ROUTE_SET,
+    direction: str = Query(None, pattern=DIRECTION_PATTERN),
+):
+    body = await public_transport_snapshot(request, route_set, direction)
+    return etag_response(request, render_public_transport(body), "text/html")
+
+
+async def scrape(kv):
+    """Scraped restaurants and the profiler when this refresh is sampled."""
+    if os.environ.get("REFRESH_WORKERS"):
+        try:
+            # scraping is done by refresh_worker.py processes, they sample profiles on their own
+            return await refresh_worker.refresh(redis_client), None
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.warning("Refresh workers unreachable, scraping in-process: %s", e)
+    profiler = await profiling.sample_refresh(kv)
+    return await gather_restaurants(profiler=profiler), profiler
+
+
 @app.get("/lunch.json")
 @app.post("/lunch.json")
 async def lunch(request: Request):
+    kv = request.app.state.kv
     now = int(datetime.datetime.now().timestamp())
     key = f'restaurants.{datetime.date.today().strftime("%d-%m-%Y")}'
-    result_str = await redis_client.get(key)
+    result_str = await kv.get(key)
     if not result_str or request.method == "POST":
         throttle_key = f"{key}.throttle"
-        if await redis_client.incr(throttle_key) != 1:
+        if await kv.incr(throttle_key) != 1:
             return {"error": "Fetch limit reached. Try again later."}
-        await redis_client.expire(throttle_key, 60 * 3)
+        await kv.expire(throttle_key, 60 * 3)
+
+        try:
+            restaurants, profiler = await scrape(kv)
+        except BaseException:
+            # failed refresh doesn't block the retries
+            await kv.delete(throttle_key)
+            raise
 
         result = {
             "last_fetch": now,
-            "fetch_count": await redis_client.incr(f"{key}.fetch_count"),
-            "restaurants": list(await gather_restaurants()),
+            "fetch_count": await kv.incr(f"{key}.fetch_count"),
+            "restaurants": list(restaurants),
         }
-        await redis_client.set(key, pickle.dumps(result))
+        if profiler:
+            report = profiler.report()
+            logger.info("Sampled refresh profile:\n%s", profiling.format_report(report, limit=10))
+            await kv.set(f"{key}.profile", json.dumps(report))
+        await kv.set(key, pickle.dumps(result))
+        try:
+            await run_in_threadpool(archive.store, datetime.date.today(), result["restaurants"])
+        except sqlite3.Error:
+            # the archive is secondary, the refresh is already cached
+            logger.exception("Archiving the refresh failed")
     else:
         result = pickle.loads(result_str)
 
@@ -69,11 +209,11 @@ async def lunch(request: Request):
 
     visitor_addr = ipaddress.ip_address(request.client.host)
     if not any([net for net in disallow_nets if visitor_addr in net]):  # noqa: C419
-        await redis_client.incr(f"{key}.access_count")
-        await redis_client.setnx(f"{key}.first_access", now)
+        await kv.incr(f"{key}.access_count")
+        await kv.setnx(f"{key}.first_access", now)
 
     async def get(k):
-        val = await redis_client.get(f"{key}.{k}")
+        val = await kv.get(f"{key}.{k}")
         if val:
             result[k] = int(val)
         else:
@@ -82,3 +222,21 @@ async def lunch(request: Request):
     await get("access_count")
     await get("first_access")
     return result
+
+
+@app.get("/lunch/search")
+def lunch_search(
+    q: str = Query(min_length=2),
+    before: int = Query(None, ge=1),
+    per_page: int = Query(20, ge=1, le=archive.MAX_PER_PAGE),
+):
+    return archive.search(q, before, per_page)
+
+
+@app.get("/lunch/history")
+def lunch_history(
+    restaurant: str,
+    before: int = Query(None, ge=1),
+    per_page: int = Query(20, ge=1, le=archive.MAX_PER_PAGE),
+):
+    return archive.history(restaurant, before, per_page)
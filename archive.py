@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+from contextlib import closing
+
+from lunches import Soup
+
+ARCHIVE_PATH = os.environ.get("LUNCH_ARCHIVE", "archive.db")
+MAX_PER_PAGE = 100
+MAX_ID = 2**63 - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS menu (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    restaurant TEXT NOT NULL,
+    title TEXT NOT NULL,
+    location TEXT,
+    kind TEXT NOT NULL,
+    num INTEGER,
+    name TEXT NOT NULL,
+    ingredients TEXT,
+    price INTEGER
+);
+CREATE INDEX IF NOT EXISTS menu_restaurant_day ON menu (restaurant, day);
+CREATE INDEX IF NOT EXISTS menu_day ON menu (day);
+-- rowid is part of every index, so this one serves the history ordered by id
+CREATE INDEX IF NOT EXISTS menu_restaurant ON menu (restaurant);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS menu_fts USING fts5(
+    name,
+    ingredients,
+    content='menu',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS menu_ai AFTER INSERT ON menu BEGIN
+    INSERT INTO menu_fts (rowid, name, ingredients) VALUES (new.id, new.name, new.ingredients);
+END;
+CREATE TRIGGER IF NOT EXISTS menu_ad AFTER DELETE ON menu BEGIN
+    INSERT INTO menu_fts (menu_fts, rowid, name, ingredients) VALUES ('delete', old.id, old.name, old.ingredients);
+END;
+"""
+
+COLUMNS = ["id", "day", "restaurant", "title", "location", "kind", "num", "name", "ingredients", "price"]
+
+
+# paths with the schema already created by this process
+initialized = set()
+
+
+def connect(path=None):
+    path = path or ARCHIVE_PATH
+    db = sqlite3.connect(path)
+    if path not in initialized:
+        # WAL is persistent in the database file, so it's set together with the schema
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(SCHEMA)
+        initialized.add(path)
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def store(day, restaurants, path=None):
+    """Replace archived menus of the given day with freshly refreshed restaurants."""
+    rows = []
+    parsed = []
+    for restaurant in restaurants:
+        if "error" in restaurant:
+            continue
+        parsed.append(restaurant["id"])
+        location = restaurant["location"]
+        for food in restaurant["soups"] + restaurant["lunches"]:
+            rows.append(
+                (
+                    day.isoformat(),
+                    restaurant["id"],
+                    restaurant["name"],
+                    getattr(location, "value", location),
+                    "soup" if isinstance(food, Soup) else "lunch",
+                    getattr(food, "num", None),
+                    food.name,
+                    getattr(food, "ingredients", None),
+                    food.price,
+                )
+            )
+
+    with closing(connect(path)) as db, db:
+        # only restaurants that were parsed successfully are replaced, failed ones keep the previous data
+        db.executemany(
+            "DELETE FROM menu WHERE restaurant = ? AND day = ?",
+            [(restaurant, day.isoformat()) for restaurant in parsed],
+        )
+        db.executemany(
+            f"INSERT INTO menu ({', '.join(COLUMNS[1:])}) VALUES ({', '.join('?' * (len(COLUMNS) - 1))})",
+            rows,
+        )
+
+
+def fts_query(q):
+    # quote every term so user input can't produce an FTS5 syntax error, and match prefixes
+    terms = [term.replace('"', '""') for term in q.split()]
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def paginate(db, sql, params, before, per_page):
+    """Page of rows with id lower than before, the next page starts before the last returned id.
+
+    Menus are archived on the day they are served, so ids grow with days and the newest come first.
+    """
+    per_page = min(per_page, MAX_PER_PAGE)
+    cursor = db.execute(sql, (*params, before or MAX_ID, per_page + 1))
+    items = [dict(zip(COLUMNS, row)) for row in cursor]
+    has_more = len(items) > per_page
+    items = items[:per_page]
+    return {
+        "per_page": per_page,
+        "next": items[-1]["id"] if has_more else None,
+        "items": items,
+    }
+
+
+def search(q, before=None, per_page=20, path=None):
+    query = fts_query(q)
+    if not query:
+        return {"per_page": min(per_page, MAX_PER_PAGE), "next": None, "items": []}
+
+    with closing(connect(path)) as db:
+        # ordered by the fts rowid, which the full-text index returns without sorting the matches
+        return paginate(
+            db,
+            f"""
+            SELECT {", ".join(f"m.{c}" for c in COLUMNS)}
+            FROM menu_fts JOIN menu m ON m.id = menu_fts.rowid
+            WHERE menu_fts MATCH ? AND menu_fts.rowid < ?
+            ORDER BY menu_fts.rowid DESC
+            LIMIT ?
+            """,
+            (query,),
+            before,
+            per_page,
+        )
+
+
+def history(restaurant, before=None, per_page=20, path=None):
+    with closing(connect(path)) as db:
+        return paginate(
+            db,
+            f"""
+            SELECT {", ".join(COLUMNS)}
+            FROM menu
+            WHERE restaurant = ? AND id < ?
+            ORDER BY id DESC
+            LIMIT ?
+            """,
+            (restaurant,),
+            before,
+            per_page,
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+    from pprint import pprint
+
+    p = argparse.ArgumentParser()
+    p.add_argument("query")
+    p.add_argument("--before", type=int)
+    args = p.parse_args()
+
+    pprint(search(args.query, args.before))
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Load test of the API against local stand-ins of redis and the upstream servers.
+
+Record the upstream responses once while online:
+
+    ./lunches.py --record responses/
+    LUNCH_RECORD_DIR=responses/ ./public_transport.py
+
+and then benchmark offline:
+
+    ./benchmark.py --replay responses/
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import redis.asyncio as redis
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_fake_redis():
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        sys.exit("Neither redis-server nor fakeredis is installed, use --redis-url or pip install fakeredis")
+
+    port = free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"redis://127.0.0.1:{port}"
+
+
+def start_redis():
+    """Local throwaway redis-server, or fakeredis when redis isn't installed."""
+    port = free_port()
+    try:
+        process = subprocess.Popen(
+            ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"], stdout=subprocess.DEVNULL
+        )
+    except FileNotFoundError:
+        return start_fake_redis(), None
+    return f"redis://127.0.0.1:{port}", process
+
+
+def dedicated_db(redis_url):
+    """Whether the url selects other than the default database, e.g. redis://host/1."""
+    return int(redis.ConnectionPool.from_url(redis_url).connection_kwargs.get("db") or 0) != 0
+
+
+def start_app(redis_url, replay, workers):
+    port = free_port()
+    data = tempfile.mkdtemp()
+    env = {
+        **os.environ,
+        "REDIS_URL": redis_url,
+        "LUNCH_REPLAY_DIR": replay,
+        "LUNCH_ARCHIVE": os.path.join(data, "archive.db"),
+        "LUNCH_LOCAL_CACHE": os.path.join(data, "cache.db"),
+    }
+    env.pop("REFRESH_WORKERS", None)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers), "--no-access-log"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    return f"http://127.0.0.1:{port}", process
+
+
+async def wait_ready(http, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await http.get(url)
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+        else:
+            return
+    raise TimeoutError(url)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+async def measure(name, request, requests, concurrency, before=None):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async def client():
+        nonlocal errors
+        while not queue.empty():
+            queue.get_nowait()
+            if before:
+                await before()
+            start = time.perf_counter()
+            try:
+                response = await request()
+                # throttled refreshes are answered with 200 and an error message
+                if response.status_code >= 400 or response.content.startswith(b'{"error"'):
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "mean": statistics.mean(latencies),
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+async def benchmark(url, redis_url, requests, concurrency, burst):
+    key = f'restaurants.{datetime.date.today().strftime("%d-%m-%Y")}'
+    redis_client = redis.Redis.from_url(redis_url)
+
+    async def drop_cache():
+        await redis_client.delete(key, f"{key}.throttle")
+
+    async def drop_throttle():
+        await redis_client.delete(f"{key}.throttle")
+
+    limits = httpx.Limits(max_connections=max(concurrency, burst))
+    async with httpx.AsyncClient(timeout=120, limits=limits) as http:
+        await wait_ready(http, url)
+        await drop_cache()
+        await http.post(f"{url}/lunch.json")
+
+        # a refresh scrapes every restaurant, so they run one by one with fewer requests
+        refreshes = max(1, requests // 20)
+        return [
+            await measure("cache-hit", lambda: http.get(f"{url}/lunch.json"), requests, concurrency),
+            await measure("cache-miss", lambda: http.get(f"{url}/lunch.json"), refreshes, 1, drop_cache),
+            await measure("post-refresh", lambda: http.post(f"{url}/lunch.json"), refreshes, 1, drop_throttle),
+            await measure("burst", lambda: http.get(f"{url}/lunch.json"), burst * 5, burst),
+            await measure("nextbikes", lambda: http.get(f"{url}/nextbikes.json"), requests, concurrency),
+            await measure("public-transport", lambda: http.get(f"{url}/public_transport"), refreshes, concurrency),
+        ]
+
+
+def format_results(results):
+    lines = [
+        f"{'scenario':<18} {'requests':>8} {'errors':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+    ]
+    for r in results:
+        lines.append(
+            f"{r['scenario']:<18} {r['requests']:>8} {r['errors']:>6} {r['rps']:9.1f}"
+            f" {r['p50'] * 1000:9.2f} {r['p95'] * 1000:9.2f} {r['p99'] * 1000:9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    import argparse
+
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--replay", metavar="DIR", required=True, help="upstream responses stored by --record")
+    p.add_argument(
+        "--redis-url",
+        help="use running redis instead of starting a throwaway one, the url has to select a database other than 0"
+        " (e.g. redis://host/15) as the cached lunches are deleted",
+    )
+    p.add_argument("--fakeredis", action="store_true", help="use fakeredis instead of redis-server")
+    p.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    p.add_argument("--requests", "-n", type=int, default=1000)
+    p.add_argument("--concurrency", "-c", type=int, default=10)
+    p.add_argument("--burst", type=int, default=100, help="concurrency of the burst scenario")
+    p.add_argument("--json", action="store_true")
+    args = p.parse_args()
+    if args.redis_url and not dedicated_db(args.redis_url):
+        p.error("--redis-url has to select a dedicated database other than 0, e.g. redis://localhost/15")
+
+    processes = []
+    redis_url = args.redis_url
+    if not redis_url:
+        if args.fakeredis:
+            redis_url = start_fake_redis()
+        else:
+            redis_url, process = start_redis()
+            processes.append(process)
+    url, process = start_app(redis_url, args.replay, args.workers)
+    processes.append(process)
+
+    try:
+        results = asyncio.run(benchmark(url, redis_url, args.requests, args.concurrency, args.burst))
+    finally:
+        for process in processes:
+            if process:
+                process.terminate()
+                process.wait()
+
+    print(json.dumps(results, indent=2) if args.json else format_results(results))
+
+
+if __name__ == "__main__":
+    main()
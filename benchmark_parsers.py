@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Compares parsers compiled from MenuSpec with the hand-written css() chains they replaced.
+
+Synthetic pages mimic the structure of the restaurant pages, the output of both versions has to match
+(prices aside, they are normalized by the cleanup) and the spec version should be at least as fast.
+"""
+
+import datetime
+import timeit
+
+from selectolax.parser import HTMLParser
+
+from lunches import Lunch, Soup, load_restaurant
+
+
+def trebovicky_mlyn(dom):
+    el = dom.css_first(".soup h2")
+    if not el:
+        return
+    yield Soup(el.text())
+
+    for lunch in dom.css_first(".owl-carousel").css(".menu-post"):
+        parts = lunch.css_first("h2").text().split(")")
+        if len(parts) == 2:
+            yield Lunch(
+                num=parts[0],
+                name=parts[1],
+                ingredients=lunch.css_first("h2 + div").text(),
+                price=lunch.css_first("span").text().split(",")[0],
+            )
+
+
+def saloon_pub(dom):
+    day = dom.css_first(f'#{datetime.datetime.strftime(datetime.datetime.now(), "%Y-%m-%d")} + section')
+    if not day:
+        return
+    yield Soup(name=day.css_first(".category-info").text())
+    for tr in day.css(".main-meal-info"):
+        yield Lunch(name=tr.css_first(".meal-name").text(), price=tr.css_first(".meal-price").text())
+
+
+def plzenka(dom):
+    food_type = None
+    for el in dom.css(".list-items > *"):
+        if el.tag == "h5":
+            food_type = {
+                "POLÉVKA": Soup,
+                "HLAVNÍ JÍDLO": Lunch,
+            }.get(el.text(strip=True), None)
+        elif food_type:
+            if food_type == Soup:
+                yield Soup(el.css_first(".modify_item").text())
+            else:
+                yield Lunch(
+                    name=el.css_first(".modify_item").text(),
+                    ingredients=el.css_first(".food-info").text(),
+                    price=el.css_first(".menu-price").text(),
+                )
+
+
+def kurniksopa(dom):
+    for pivo in dom.css("#naCepu-list tr"):
+        name = pivo.css_first(".nazev").text()
+        deg = pivo.css_first(".stupne").text()
+        type = pivo.css_first(".typ").text()
+        origin = pivo.css_first(".puvod").text()
+        yield Lunch(
+            name=f"{name} {deg} - {type}, {origin}",
+        )
+
+
+def pages():
+    today = datetime.date.today().isoformat()
+    carousel = (
+        '<div class="owl-carousel">'
+        + "".join(
+            f'<div class="menu-post"><h2>{i}) Jídlo {i}</h2><div>přílohy {i}</div><span>{100 + i},00 Kč</span></div>'
+            for i in range(6)
+        )
+        + "</div>"
+    )
+    yield trebovicky_mlyn, f'<div class="soup"><h2>Guláš</h2></div>{carousel}'
+    yield trebovicky_mlyn, carousel
+    yield (
+        saloon_pub,
+        f'<div id="{today}"></div><section><div class="category-info">Polévka</div>'
+        + "".join(
+            f'<div class="main-meal-info"><span class="meal-name">Jídlo {i}</span>'
+            f'<span class="meal-price">{i}0</span></div>'
+            for i in range(8)
+        )
+        + "</section>",
+    )
+    item = (
+        '<div><div class="wrap"><p>x</p><span class="modify_item">Jídlo</span>'
+        '<div class="food-info">přílohy</div><em>z</em><span class="menu-price">150</span></div></div>'
+    )
+    yield plzenka, f'<div class="list-items"><h5>POLÉVKA</h5>{item * 2}<h5>HLAVNÍ JÍDLO</h5>{item * 30}</div>'
+    yield (
+        kurniksopa,
+        '<table id="naCepu-list">'
+        + "".join(
+            '<tr><td class="nazev">Pilsner</td><td class="stupne">12</td><td class="typ">ležák</td>'
+            '<td class="puvod">CZ</td></tr>'
+            for _ in range(40)
+        )
+        + "</table>",
+    )
+
+
+def comparable(items):
+    return [
+        (type(item).__name__, item.name, getattr(item, "num", None), getattr(item, "ingredients", None))
+        for item in items
+    ]
+
+
+def main():
+    import argparse
+
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--number", "-n", type=int, default=200)
+    p.add_argument("--repeat", "-r", type=int, default=10)
+    args = p.parse_args()
+
+    print(f"{'parser':<18} {'match':>5} {'old us':>8} {'spec us':>8}")
+    for reference, html in pages():
+        spec = load_restaurant(reference.__name__)
+        dom = HTMLParser(html)
+        match = comparable(reference(dom)) == comparable(spec(dom))
+        # best of the repeats, the others are slowed down by the rest of the system
+        old = min(timeit.repeat(lambda: list(reference(dom)), number=args.number, repeat=args.repeat)) / args.number
+        new = min(timeit.repeat(lambda: list(spec(dom)), number=args.number, repeat=args.repeat)) / args.number
+        print(f"{reference.__name__:<18} {match!s:>5} {old * 1e6:8.1f} {new * 1e6:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import redis.asyncio as redis
+from starlette.concurrency import run_in_threadpool
+
+REDIS_TIMEOUT = float(os.environ.get("REDIS_TIMEOUT", 1))
+REDIS_MAX_CONNECTIONS = int(os.environ.get("REDIS_MAX_CONNECTIONS", 50))
+LOCAL_CACHE_PATH = os.environ.get("LUNCH_LOCAL_CACHE", "cache.db")
+# how long to serve from the local cache before trying redis again
+RETRY_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+
+def to_bytes(value):
+    # same conversion redis does with the values
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode()
+
+
+class RedisCache:
+    def __init__(self, url):
+        pool = redis.BlockingConnectionPool.from_url(
+            url,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_TIMEOUT,
+            socket_timeout=REDIS_TIMEOUT,
+            socket_connect_timeout=REDIS_TIMEOUT,
+            socket_keepalive=True,
+            health_check_interval=30,
+        )
+        self.redis = redis.Redis(connection_pool=pool)
+
+    async def get(self, key):
+        return await self.redis.get(key)
+
+    async def set(self, key, value, ex=None, px=None, keepttl=False):
+        return await self.redis.set(key, value, ex=ex, px=px, keepttl=keepttl)
+
+    async def incr(self, key):
+        return await self.redis.incr(key)
+
+    async def expire(self, key, seconds):
+        return await self.redis.expire(key, seconds)
+
+    async def setnx(self, key, value):
+        return await self.redis.setnx(key, value)
+
+    async def delete(self, *keys):
+        return await self.redis.delete(*keys)
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+class LocalCache:
+    """Key value store in SQLite with expiration.
+
+    Queries run in the threadpool, a write can wait for the lock held by another process up to the busy timeout.
+    """
+
+    def __init__(self, path=LOCAL_CACHE_PATH):
+        self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        # the connection and its transactions are shared by the threads
+        self.lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # it's only a cache, losing the last writes on power failure is fine
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)")
+        self.db.execute("DELETE FROM kv WHERE expires <= ?", (time.time(),))
+
+    def item(self, key):
+        """Value and expiration time of the key, (None, None) when it doesn't exist."""
+        row = self.db.execute(
+            "SELECT value, expires FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return row or (None, None)
+
+    @contextmanager
+    def transaction(self):
+        # IMMEDIATE takes the write lock upfront, so the read-modify-write isn't racing other processes
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+
+    def put(self, key, value, expires):
+        self.db.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?)", (key, to_bytes(value), expires))
+
+    async def run(self, fn, *args):
+        def locked():
+            with self.lock:
+                return fn(*args)
+
+        return await run_in_threadpool(locked)
+
+    async def get(self, key):
+        return (await self.run(self.item, key))[0]
+
+    async def set(self, key, value, ex=None, px=None, keepttl=False):
+        def query():
+            expires = None
+            if ex is not None:
+                expires = time.time() + ex
+            elif px is not None:
+                expires = time.time() + px / 1000
+            elif keepttl:
+                expires = self.item(key)[1]
+            self.put(key, value, expires)
+            return True
+
+        return await self.run(query)
+
+    async def incr(self, key):
+        def query():
+            with self.transaction():
+                value, expires = self.item(key)
+                value = int(value or 0) + 1
+                self.put(key, value, expires)
+            return value
+
+        return await self.run(query)
+
+    async def expire(self, key, seconds):
+        def query():
+            value, _ = self.item(key)
+            if value is None:
+                return False
+            self.put(key, value, time.time() + seconds)
+            return True
+
+        return await self.run(query)
+
+    async def setnx(self, key, value):
+        def query():
+            with self.transaction():
+                if self.item(key)[0] is not None:
+                    return False
+                self.put(key, value, None)
+            return True
+
+        return await self.run(query)
+
+    async def delete(self, *keys):
+        def query():
+            return self.db.executemany("DELETE FROM kv WHERE key = ?", [(key,) for key in keys]).rowcount
+
+        return await self.run(query)
+
+    async def close(self):
+        await self.run(self.db.close)
+
+
+class FallbackCache:
+    """Redis with writes mirrored to the local cache, which serves the requests while redis is unavailable.
+
+    Keys written during the outage are copied to redis once it's back.
+    """
+
+    def __init__(self, primary, local):
+        self.primary = primary
+        self.local = local
+        self.retry_at = None
+        self.dirty = set()
+        # a dirty key is copied once, by the request needing it or by the background task
+        self.copying = asyncio.Lock()
+        self.warming = None
+
+    async def run(self, name, *args, keys=(), mirror=None):
+        """Runs the operation on redis, or on the local cache while redis is unavailable.
+
+        keys are the keys the operation reads or writes, the writes are mirrored to the local cache by mirror.
+        """
+        if self.retry_at is None or time.monotonic() >= self.retry_at:
+            try:
+                # keys written during the outage are copied first, so the operation sees their latest values
+                for key in keys:
+                    if key in self.dirty:
+                        await self.copy(key)
+                result = await getattr(self.primary, name)(*args)
+            except (redis.ConnectionError, redis.TimeoutError) as e:
+                if self.retry_at is None:
+                    logger.warning("Redis unavailable, serving from the local cache: %s", e)
+                self.retry_at = time.monotonic() + RETRY_INTERVAL
+            else:
+                if self.retry_at is not None:
+                    logger.info("Redis available again")
+                    self.retry_at = None
+                if self.dirty and not self.warming:
+                    # the rest is copied in the background, the request doesn't wait for the whole outage
+                    self.warming = asyncio.create_task(self.warm())
+                if mirror:
+                    try:
+                        await mirror(result)
+                    except sqlite3.Error as e:
+                        # redis has the write, the local copy is best effort
+                        logger.warning("Mirroring %s to the local cache failed: %s", name, e)
+                return result
+
+        if mirror:
+            # only writes make redis outdated
+            self.dirty.update(keys)
+        return await getattr(self.local, name)(*args)
+
+    async def copy(self, key):
+        """Copies the key written during the outage to redis."""
+        async with self.copying:
+            if key not in self.dirty:
+                return
+            value, expires = await self.local.run(self.local.item, key)
+            if value is None:
+                await self.primary.delete(key)
+            elif expires is None:
+                await self.primary.set(key, value)
+            elif expires > time.time():
+                await self.primary.set(key, value, px=max(1, int((expires - time.time()) * 1000)))
+            self.dirty.discard(key)
+
+    async def warm(self):
+        """Copies keys written during the outage to redis."""
+        try:
+            for key in list(self.dirty):
+                await self.copy(key)
+            logger.info("Local cache copied back to redis")
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            # the rest is copied once redis responds again
+            logger.warning("Copying the local cache to redis failed: %s", e)
+        finally:
+            self.warming = None
+
+    async def get(self, key):
+        return await self.run("get", key, keys=[key])
+
+    async def set(self, key, value, ex=None):
+        async def mirror(_):
+            await self.local.set(key, value, ex)
+
+        return await self.run("set", key, value, ex, keys=[key], mirror=mirror)
+
+    async def incr(self, key):
+        async def mirror(value):
+            await self.local.set(key, value, keepttl=True)
+
+        return await self.run("incr", key, keys=[key], mirror=mirror)
+
+    async def expire(self, key, seconds):
+        async def mirror(_):
+            await self.local.expire(key, seconds)
+
+        return await self.run("expire", key, seconds, keys=[key], mirror=mirror)
+
+    async def setnx(self, key, value):
+        async def mirror(created):
+            if created:
+                await self.local.set(key, value)
+
+        return await self.run("setnx", key, value, keys=[key], mirror=mirror)
+
+    async def delete(self, *keys):
+        async def mirror(_):
+            await self.local.delete(*keys)
+
+        return await self.run("delete", *keys, keys=keys, mirror=mirror)
+
+    async def close(self):
+        if self.warming:
+            self.warming.cancel()
+        await self.primary.close()
+        await self.local.close()
+
+
+def from_env():
+    return FallbackCache(RedisCache(os.environ.get("REDIS_URL", "redis://localhost")), LocalCache())
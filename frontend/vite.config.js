@@ -4,12 +4,19 @@ import { viteSingleFile } from "vite-plugin-singlefile"
 
 // https://vitejs.dev/config/
 export default defineConfig({
-  plugins: [svelte(), viteSingleFile()],
+  // hashed assets are served by the backend with immutable caching,
+  // SINGLEFILE=1 inlines everything into index.html instead
+  plugins: process.env.SINGLEFILE ? [svelte(), viteSingleFile()] : [svelte()],
+  // relative asset urls keep working behind a path prefix
+  base: './',
   server: {
     proxy: {
       '/lunch.json': {
         target: 'http://localhost:8000',
-      }
+      },
+      '/nextbikes.json': {
+        target: 'http://localhost:8000',
+      },
     }
   }
 })
@@ -1,22 +1,33 @@
 #!/usr/bin/env python3
+import ast
 import asyncio
 import datetime
+import functools
+import importlib
 import inspect
-import json
 import logging
 import re
 import string
 import time
 import traceback
-from dataclasses import dataclass
+from contextlib import nullcontext
+from dataclasses import dataclass, field
 from enum import Enum
 from html import unescape
+from pathlib import Path
 
 import httpx
-from selectolax.parser import HTMLParser, Selector
+from selectolax.parser import HTMLParser
+
+from recording import transport_from_env
 
 days = ["Pondělí", "Úterý", "Středa", "Čtvrtek", "Pátek", "Sobota", "Neděle"]
 USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/105.0.0.0 Safari/537.36"
+PLUGINS_PACKAGE = "restaurants"
+PLUGINS_DIR = Path(__file__).parent / PLUGINS_PACKAGE
+
+# restaurants registered by the @restaurant decorator, filled as the plugins get imported
+registry = {}
 
 
 class Location(str, Enum):
@@ -29,16 +40,22 @@ class Location(str, Enum):
 
 def restaurant(title, url=None, location: Location = None):
     def wrapper(fn):
+        name = fn.__name__
+        if not fn.__code__.co_argcount:
+            # parser without arguments returns MenuSpec(s) that are compiled just once
+            fn = compile_specs(fn())
+
         def wrap(*args, **kwargs):
             return fn(*args, **kwargs)
 
         wrap.parser = {
-            "name": fn.__name__,
+            "name": name,
             "title": title,
             "url": url,
             "location": location,
             "args": fn.__code__.co_varnames[: fn.__code__.co_argcount],
         }
+        registry[name] = wrap
         return wrap
 
     return wrapper
@@ -60,6 +77,292 @@ class Lunch:
     photo: str = None
 
 
+@dataclass
+class MenuSpec:
+    """Declarative menu description compiled by `restaurant` into an extractor walking each row just once.
+
+    rows: selector of menu rows, relative to the root
+    fields: field -> selector relative to the row, (selector, n) for the n-th match or None for the row itself
+    kind: Soup, Lunch or a callable returning Soup/Lunch/None (skip the row) for the extracted fields
+    sections: (selector, {heading text: Soup/Lunch}), matching rows switch the kind of the following rows
+    patterns: field -> regex, its named groups update the fields and rows not matching are skipped
+    templates: field -> format string filled with the extracted fields, rows missing any of them are skipped
+    root: selector or a callable returning it, nothing is extracted when the root is missing
+    limit: maximum number of rows
+    required: when nothing is extracted by this spec, the following specs are skipped too
+
+    The n-th match of a selector is counted in document order, except for selectors with combinators
+    which count like css() does (e.g. "* > span" groups the matches by their parent).
+    """
+
+    rows: str
+    fields: dict
+    kind: type = Lunch
+    sections: tuple = None
+    patterns: dict = field(default_factory=dict)
+    templates: dict = field(default_factory=dict)
+    root: str = None
+    limit: int = None
+    required: bool = False
+
+
+class UnsupportedSelectorError(ValueError):
+    def __init__(self, selector):
+        super().__init__(f"Unsupported selector: {selector}")
+
+
+class NodeSelector:
+    """Subset of CSS selectors (tag, .class, #id, *, descendant, > and + combinators) matched in python.
+
+    Unlike css/css_first it does not search the tree, it only tests a node already visited by a traversal.
+    """
+
+    COMPOUND_REGEXP = re.compile(r"^(?P<tag>\*|[a-zA-Z][\w-]*)?(?P<rest>([.#][\w-]+)*)$")
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.parts = []
+        combinator = None
+        for token in re.sub(r"\s*([>+])\s*", r" \1 ", selector).split():
+            if token in (">", "+"):
+                if not self.parts or combinator:
+                    raise UnsupportedSelectorError(selector)
+                combinator = token
+                continue
+            m = self.COMPOUND_REGEXP.match(token)
+            if not m:
+                raise UnsupportedSelectorError(selector)
+            tag = m.group("tag")
+            rest = re.findall(r"([.#])([\w-]+)", m.group("rest"))
+            self.parts.append(
+                (
+                    combinator or " ",
+                    None if tag in (None, "*") else tag.lower(),
+                    {name for prefix, name in rest if prefix == "."},
+                    next((name for prefix, name in rest if prefix == "#"), None),
+                )
+            )
+            combinator = None
+        if not self.parts or combinator:
+            raise UnsupportedSelectorError(selector)
+
+    def matches(self, node, scope=None, tag=None, attrs=None):
+        # tag and attributes of the tested node might be passed by the caller who already read them
+        return self._matches(node, len(self.parts) - 1, scope, tag, attrs)
+
+    def _matches(self, node, i, scope, node_tag=None, attrs=None):
+        combinator, tag, classes, id = self.parts[i]
+        if tag and (node_tag or node.tag) != tag:
+            return False
+        if classes or id:
+            if attrs is None:
+                attrs = node.attributes
+            if id and attrs.get("id") != id:
+                return False
+            if classes and not classes.issubset((attrs.get("class") or "").split()):
+                return False
+        if i == 0:
+            return True
+
+        if combinator == "+":
+            sibling = node.prev
+            while sibling is not None and sibling.tag in ("-text", "_comment"):
+                sibling = sibling.prev
+            return sibling is not None and self._matches(sibling, i - 1, scope)
+
+        # ancestors are searched up to the scope node itself, the same way as css() called on the scope
+        parent = node.parent
+        while parent is not None and (scope is None or node.mem_id != scope.mem_id):
+            if self._matches(parent, i - 1, scope):
+                return True
+            if combinator == ">":
+                return False
+            node, parent = parent, parent.parent
+        return False
+
+    @property
+    def tag(self):
+        return self.parts[-1][1]
+
+    @property
+    def simple(self):
+        """Single tag or class without combinators."""
+        if len(self.parts) > 1:
+            return False
+        _, tag, classes, id = self.parts[0]
+        return not id and (bool(tag) + len(classes)) == 1
+
+    @property
+    def needs_attributes(self):
+        _, _, classes, id = self.parts[-1]
+        return bool(classes or id)
+
+
+def compile_spec(spec):
+    row_fields = []
+    # fields sharing a selector (e.g. n-th td) are matched together, {selector: (NodeSelector, {nth: field})}
+    selectors = {}
+    for name, selector in spec.fields.items():
+        if selector is None:
+            row_fields.append(name)
+            continue
+        selector, nth = selector if isinstance(selector, tuple) else (selector, 0)
+        if selector not in selectors:
+            selectors[selector] = (NodeSelector(selector), {})
+        selectors[selector][1][nth] = name
+
+    # css() doesn't return matches of selectors with combinators in document order (e.g. "* > span" groups them
+    # by the parent), so the n-th match of those is looked up by css() to count the same way;
+    # a single css() call also beats walking the row in python when all fields share one selector
+    css_fields = []
+    traversed = []
+    for selector, (node_selector, nths) in selectors.items():
+        if len(selectors) == 1 or (len(node_selector.parts) > 1 and any(nths)):
+            css_fields.append((selector, list(nths.items())))
+        else:
+            traversed.append((node_selector, nths))
+
+    # candidates by the tag or a class of their rightmost part, so most nodes are rejected by a single lookup,
+    # selectors matching any tag are merged into every tag list upfront
+    by_tag = {}
+    by_class = {}
+    any_tag = []
+    for node_selector, nths in traversed:
+        candidate = (node_selector, nths, node_selector.simple)
+        _, tag, classes, _ = node_selector.parts[-1]
+        if tag:
+            by_tag.setdefault(tag, []).append(candidate)
+        elif classes:
+            by_class.setdefault(min(classes), []).append(candidate)
+        else:
+            any_tag.append(candidate)
+    for candidates in by_tag.values():
+        candidates.extend(any_tag)
+    traversed_fields = sum(len(nths) for _, nths in traversed)
+    needs_attributes = any(node_selector.needs_attributes for node_selector, _ in traversed)
+
+    patterns = {name: re.compile(pattern) for name, pattern in spec.patterns.items()}
+    # fields referenced by the templates, rows missing any of them are skipped
+    templates = list(spec.templates.items())
+    template_fields = {
+        f for template in spec.templates.values() for _, f, _, _ in string.Formatter().parse(template) if f
+    }
+    section_selector, sections = (NodeSelector(spec.sections[0]), spec.sections[1]) if spec.sections else (None, None)
+
+    empty = dict.fromkeys(spec.fields)
+
+    def extract_fields(row):
+        values = empty.copy()
+        for name in row_fields:
+            values[name] = row.text()
+        for selector, nths in css_fields:
+            nodes = row.css(selector)
+            count = len(nodes)
+            for nth, name in nths:
+                if nth < count:
+                    values[name] = nodes[nth].text()
+
+        if not traversed_fields:
+            return values
+        pending = traversed_fields
+        seen = {}
+        # depth first walk in document order, Node.traverse() would continue past the row to its siblings
+        stack = list(row.iter())
+        stack.reverse()
+        while stack:
+            node = stack.pop()
+            tag = node.tag
+            candidates = by_tag.get(tag, any_tag)
+            attrs = None
+            if by_class:
+                attrs = node.attributes
+                for name in set((attrs.get("class") or "").split()):
+                    if name in by_class:
+                        candidates = candidates + by_class[name]
+            if candidates:
+                if attrs is None and needs_attributes:
+                    attrs = node.attributes
+                for selector, nths, simple in candidates:
+                    # the lookup alone matches selectors of a single tag or class
+                    if simple or selector.matches(node, row, tag, attrs):
+                        nth = seen.get(selector, 0)
+                        seen[selector] = nth + 1
+                        if nth in nths:
+                            values[nths[nth]] = node.text()
+                            pending -= 1
+                if not pending:
+                    break
+            children = list(node.iter())
+            if children:
+                children.reverse()
+                stack.extend(children)
+        return values
+
+    def apply_patterns(values):
+        """Updates the values by named groups of the patterns, False when a pattern doesn't match."""
+        for name, pattern in patterns.items():
+            if values[name] is None:
+                continue
+            m = pattern.search(values[name])
+            if not m:
+                return False
+            values.update(m.groupdict())
+        return True
+
+    def extract(dom):
+        root = dom
+        if spec.root:
+            root = dom.css_first(spec.root() if callable(spec.root) else spec.root)
+            if not root:
+                return
+
+        kind = None if sections else spec.kind
+        rows = root.css(spec.rows)
+        for row in rows if spec.limit is None else rows[: spec.limit]:
+            if section_selector and section_selector.matches(row):
+                kind = sections.get(row.text(strip=True))
+                continue
+            if not kind:
+                continue
+
+            values = extract_fields(row)
+            if patterns and not apply_patterns(values):
+                continue
+            if template_fields:
+                if any(values[f] is None for f in template_fields):
+                    continue
+                for name, template in templates:
+                    values[name] = template.format(**values)
+
+            t = kind if kind is Soup or kind is Lunch else kind(values)
+            if t and values["name"] is not None:
+                params = t.__dataclass_fields__
+                if values.keys() <= params.keys():
+                    yield t(**values)
+                else:
+                    yield t(**{k: v for k, v in values.items() if k in params})
+
+    return extract
+
+
+def compile_specs(specs):
+    specs = specs if isinstance(specs, (list, tuple)) else [specs]
+    extractors = [(compile_spec(spec), spec.required) for spec in specs]
+    if len(extractors) == 1:
+        return extractors[0][0]
+
+    def dom_extractor(dom):
+        for extract, required in extractors:
+            extracted = False
+            for item in extract(dom):
+                extracted = True
+                yield item
+            if required and not extracted:
+                return
+
+    return dom_extractor
+
+
 def menicka_parser(dom):
     current_day = datetime.datetime.now().strftime("%-d.%-m.%Y")
     for day_dom in dom.css(".content"):
@@ -91,504 +394,82 @@ async def subprocess_check_output(cmd, input):
     return (await p.communicate(input))[0].decode("utf-8")
 
 
-@restaurant("Bistro IN", "https://bistroin.choiceqr.com/delivery", Location.Poruba)
-def bistroin(dom):
-    data = json.loads(dom.css_first("#__NEXT_DATA__").text())
-
-    for item in data["props"]["app"]["menu"]:
-        ingredients = re.sub(r"Al\. \(.+", "", item["description"])
-        price = item["price"] // 100
-        if "Polévka k menu:" in item["name"]:
-            yield Soup(name=item["name"].split(":")[1], price=price)
-        else:
-            match = re.match(r"^\s*(?P<num>[0-9]+)\s*\.\s*(?P<name>.+)", item["name"])
-            if match:
-                yield Lunch(**match.groupdict(), price=price - 10, ingredients=ingredients)
-
-
-@restaurant("U jarosu", "https://www.ujarosu.cz/cz/denni-menu/", Location.Poruba)
-def u_jarosu(dom):
-    today = datetime.datetime.strftime(datetime.datetime.now(), "%d. %m. %Y")
-    for row in dom.css(".celyden"):
-        parsed_day = row.css_first(".datum").text()
-        if parsed_day == today:
-            records = row.css(".tabulka p")
-            records = [r.text().strip() for r in records]
-            records = [records[i : i + 3] for i in range(0, len(records), 3)]
-            for first, name, price in records:
-                if first == "Polévka":
-                    yield Soup(name)
-                else:
-                    yield Lunch(name, price=price, num=first.split(".")[0])
+def fix_price(price):
+    if not price:
+        return None
+    if not isinstance(price, str):
+        return int(price)
+    try:
+        sanitized = re.sub("kč", "", price, flags=re.IGNORECASE)
+        sanitized = sanitized.replace(".00", "").strip(string.punctuation + string.whitespace)
+        return int(sanitized)
+    except ValueError as e:
+        print(e)
+    return None
 
 
-@restaurant("U zlateho lva", "http://www.zlatylev.com/menu_zlaty_lev.html", Location.Poruba)
-def u_zlateho_lva(dom):
-    day_nth = datetime.datetime.today().weekday()
-    text = dom.css_first(".xr_txt.xr_s0").text()
+def scan_plugin(path):
+    """Read metadata of restaurants declared in the plugin source without importing it."""
 
-    capturing = False
-    state = "num"
-    for line in text.splitlines():
-        line = line.strip()
+    def value(node):
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "Location":
+            return Location[node.attr]
+        return ast.literal_eval(node)
 
-        if line.startswith(days[day_nth]):
-            capturing = True
-        elif capturing:
-            if day_nth < 4 and line.startswith(days[day_nth + 1]):
-                break
-            soup_prefix = "Polévka:"
-            if line.startswith(soup_prefix):
-                yield Soup(line.replace(soup_prefix, ""))
-            else:
-                if state == "num":
-                    if re.match(r"^[0-9]+\.", line):
-                        line, name = line.split(".", 1)
-                        food = Lunch(name=name, num=line)
-                        state = "price" if name else "name"
-                elif state == "name":
-                    if line:
-                        food.name = line
-                        state = "price"
-                elif state == "price":  # noqa: SIM102
-                    if re.match(r"^[0-9]+\s*(,-|Kč)$", line):
-                        food.price = line.split(" ")[0]
-                        yield food
-                        state = "num"
-
-
-@restaurant("Globus", "https://www.globus.cz/ostrava/sluzby-a-produkty/restaurace", Location.Poruba)
-def globus(dom):
-    for row in dom.css(".space-y-2 .flex"):
-        spans = row.css("* > span")
-        price = fix_price(spans[2].text())
-        t = Soup if price < 50 else Lunch
-        yield t(spans[1].text(), price=price)
-
-
-@restaurant("Jacks Burger", "https://www.zomato.com/cs/widgets/daily_menu.php?entity_id=16525845", Location.Poruba)
-def jacks_burger(dom):
-    started = False
-    full_name = ""
-    num = None
-    price = None
-    for el in dom.css(".main-body > div"):
-        if el.css_matches(".line-wider"):
-            break
-        name = el.css_first(".item-name")
-        if name is None:
-            continue
-        name = name.text(strip=True)
-        if "ROZVOZ PŘES" in name.upper() or "---------" in name or "JBB OSTRAVA" in name.upper():
+    for node in ast.parse(path.read_text()).body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
             continue
-
-        if re.match(r"^[0-9]+\..+", name):
-            if full_name:
-                yield Lunch(name=full_name, price=price, num=num)
-                full_name = ""
-                price = None
-            num = name.split(".")[0]
-
-        full_name += name
-        if not started:
-            if full_name != "Polévka dle denní nabídky":
-                yield Soup(name=full_name)
-            full_name = ""
-            started = True
-        else:
-            price = el.css_first(".item-price")
-            if price:
-                price = price.text(strip=True)
-                if price:
-                    yield Lunch(name=full_name, price=price, num=num)
-                    full_name = ""
-                    price = None
-                    num = None
-
-
-@restaurant("Poklad", "https://dkpoklad.cz/restaurace/", Location.Poruba)
-async def poklad(dom, http):
-    pdf_url = dom.css_first(".restaurace-box .wp-block-file a").attributes["href"]
-    pdf = (await http.get(pdf_url)).content
-    text = await subprocess_check_output(["pdftotext", "-layout", "-", "-"], pdf)
-
-    today = datetime.datetime.strftime(datetime.datetime.now(), "%-d I %-m")
-    tomorrow = datetime.datetime.strftime(datetime.datetime.now() + datetime.timedelta(days=1), "%-d I %-m")
-    capturing = False
-    soup = True
-    item = None
-    for line in text.splitlines():
-        if today in line:
-            capturing = True
-        elif capturing:
-            if tomorrow in line or "NABÍDKA NÁPOJŮ" in line:
-                break
-            if soup:
-                soup = False
-                for s in line.split(" I "):
-                    yield Soup(s)
-            else:
-                print(line)
-                m = re.match(r"^\s*(?P<num>([0-9]+|BUSINESS))\s*\.?\s*(?P<name>.*?) (?P<price>[0-9]+) Kč", line)
-                if m:
-                    if item:
-                        yield Lunch(**item)
-                    item = m.groupdict()
-                elif item:
-                    if not line:
-                        yield Lunch(**item)
-                        item = None
-                    else:
-                        item["name"] += line
-
-    if item:
-        yield Lunch(**item)
-
-
-@restaurant("Trebovicky mlyn", "https://www.trebovickymlyn.cz/denni-menu/", Location.Poruba)
-def trebovicky_mlyn(dom):
-    el = dom.css_first(".soup h2")
-    if not el:
-        return
-    yield Soup(el.text())
-
-    for lunch in dom.css_first(".owl-carousel").css(".menu-post"):
-        parts = lunch.css_first("h2").text().split(")")
-        if len(parts) == 2:
-            yield Lunch(
-                num=parts[0],
-                name=parts[1],
-                ingredients=lunch.css_first("h2 + div").text(),
-                price=lunch.css_first("span").text().split(",")[0],
+        for decorator in node.decorator_list:
+            if (
+                not isinstance(decorator, ast.Call)
+                or not isinstance(decorator.func, ast.Name)
+                or decorator.func.id != "restaurant"
+            ):
+                continue
+            params = inspect.signature(restaurant).bind(
+                *[value(arg) for arg in decorator.args],
+                **{kw.arg: value(kw.value) for kw in decorator.keywords},
             )
+            params.apply_defaults()
+            yield {
+                "name": node.name,
+                **params.arguments,
+                # parsers without arguments are compiled from MenuSpec(s) into a dom parser
+                "args": tuple(arg.arg for arg in node.args.args) or ("dom",),
+            }
 
 
-@restaurant("La Strada", "https://www.lastrada.cz/cz/?tpl=plugins/DailyMenu/print&week_shift=", Location.Poruba)
-def lastrada(dom):
-    day_nth = datetime.datetime.today().weekday()
-
-    capturing = False
-    for tr in dom.css("tr"):
-        if tr.css_matches(".day"):
-            capturing = False
-            if days[day_nth] in tr.text() or "Menu na celý týden" in tr.text():
-                capturing = True
-        elif capturing:
-            if tr.css_matches(".highlight"):
-                yield Lunch(name=tr.css_first("td").text(), price=tr.css_first(".price").text())
-
-
-@restaurant("Ellas", "https://www.restauraceellas.cz/", Location.Poruba)
-def ellas(dom):
-    day_nth = datetime.datetime.today().weekday()
-
-    for div in dom.css(".moduletable .custom"):
-        if div.css_first("h3").text(strip=True) != days[day_nth]:
-            continue
-        foods = div.css("p")
-        yield Soup(name=foods[0].text())
-
-        for food in foods[1:]:
-            if food.text():
-                parsed = re.match(
-                    r"\s*(?P<num>[0-9]+)\s*\.\s*(?P<name>.*?)\s*(\([0-9 ,]+\))?\s*(?P<price>[0-9]+),-",  # noqa: E501
-                    food.text(),
-                ).groupdict()
-
-                m = re.match(r"^(?P<name>[A-Z -]+)\s+(?P<ingredients>.*?)$", parsed["name"])
-                if m:
-                    parsed.update(m.groupdict())
-
-                yield Lunch(**parsed)
-
-
-@restaurant("Saloon Pub", "http://www.saloon-pub.cz/cs/denni-nabidka/", Location.Poruba)
-def saloon_pub(dom):
-    day = dom.css_first(f'#{datetime.datetime.strftime(datetime.datetime.now(), "%Y-%m-%d")} + section')
-    if not day:
-        return
-    yield Soup(name=day.css_first(".category-info").text())
-    for tr in day.css(".main-meal-info"):
-        yield Lunch(name=tr.css_first(".meal-name").text(), price=tr.css_first(".meal-price").text())
-
-
-@restaurant("Parlament", "https://www.restauraceparlament.cz/", Location.Poruba)  # codespell:ignore
-def parlament(dom):  # codespell:ignore
-    day_nth = datetime.datetime.today().weekday()
-    day = Selector(dom.css_first(".txt"), "div div").text_contains(days[day_nth])
-    if day:
-        day = day.matches[0]
-        yield Soup(day.css_first("* + dt").text())
-        for line in day.css_first("* + dt + p").text().splitlines():
-            m = re.match(r"(?P<num>\d+)\.\s*(?P<name>.*?)(?P<price>\d+),-Kč", line)
-            if m:
-                yield Lunch(**m.groupdict())
-
-
-@restaurant("Plzenka aura", "https://www.plzenkaaura.cz/denni-menu", Location.Poruba)
-def plzenka(dom):
-    food_type = None
-    for el in dom.css(".list-items > *"):
-        if el.tag == "h5":
-            food_type = {
-                "POLÉVKA": Soup,
-                "HLAVNÍ JÍDLO": Lunch,
-            }.get(el.text(strip=True), None)
-        elif food_type:
-            if food_type == Soup:
-                yield Soup(el.css_first(".modify_item").text())
-            else:
-                yield Lunch(
-                    name=el.css_first(".modify_item").text(),
-                    ingredients=el.css_first(".food-info").text(),
-                    price=el.css_first(".menu-price").text(),
-                )
-
-
-@restaurant("El Amigo Muerto", "https://www.menicka.cz/api/iframe/?id=5560", Location.Poruba)
-def el_amigo_muerto(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Rusty Bell Pub", "https://www.menicka.cz/api/iframe/?id=1547", Location.Poruba)
-def rusty_bell_pub(dom):
-    foods = list(menicka_parser(dom))
-    if not foods:
-        return
-    yield Soup(foods[1].name)
-    for food in foods[2:]:
-        food.num = None
-        yield food
-
-
-@restaurant("Viktorka", "https://www.menicka.cz/api/iframe/?id=6603", Location.Poruba)
-def viktorka(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Futrovna", "https://www.menicka.cz/api/iframe/?id=7200", Location.Poruba)
-def futrovna(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Kurnik sopa", "https://www.kurniksopahospoda.cz", Location.Poruba)
-def kurniksopa(dom):
-    for pivo in dom.css("#naCepu-list tr"):
-        name = pivo.css_first(".nazev").text()
-        deg = pivo.css_first(".stupne").text()
-        type = pivo.css_first(".typ").text()
-        origin = pivo.css_first(".puvod").text()
-        yield Lunch(
-            name=f"{name} {deg} - {type}, {origin}",
-        )
-
-
-@restaurant("Sbeerka", "https://sbeerka.cz/denni-nabidka", Location.Poruba)
-async def sbeerka(dom, http):
-    REGEXP = re.compile(r"(?P<name>.*?)\s*(/[0-9,\s*]+/)?\s*(?P<price>[0-9]+\s*,-)")
-    t = None
-    for line in dom.css_first(".wysiwyg").text().splitlines():
-        line = line.strip()
-        if "Polévky" in line:
-            t = Soup
-        elif "Hlavní chody" in line:
-            t = Lunch
-        elif t and "Záloha" not in line:
-            m = REGEXP.search(line)
-            if m:
-                yield t(**m.groupdict())
-
-    PRICE_REGEXP = re.compile(r"([0-9]+)\s*,-")
-    response = await http.get("https://sbeerka.cz/aktualne-na-cepu", headers={"User-Agent": USER_AGENT})
-    dom = HTMLParser(response.text)
-    for beer in dom.css(".wysiwyg li"):
-        price = None
-        m = PRICE_REGEXP.search(beer.text())
-        if m:
-            price = m.group(0)
-        yield Lunch(name=beer.text(), price=price)
-
-
-@restaurant("Menza", "https://stravovani.vsb.cz/webkredit", Location.Poruba)
-async def menza(http):
-    date = datetime.datetime.now().replace(hour=22, minute=0, second=0, microsecond=0)
-    fdate = date.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
-
-    res = await http.get(f"https://stravovani.vsb.cz/webkredit/Api/Ordering/Menu?Dates={fdate}Z&CanteenId=1")
-    g = json.loads(res.text)["groups"]
-    if not g:
-        return
-
-    soup = g[0]["rows"][0]["item"]
-    yield Soup(soup["mealName"], soup["price"])
-
-    for lunch in g[1]["rows"]:
-        lunch = lunch["item"]
-        if lunch["price"] != 0:
-            yield Lunch(lunch["mealName"], lunch["price"])
-
-
-@restaurant("La Futura", "https://lafuturaostrava.cz/", Location.Dubina)
-def lafutura(dom):
-    container = dom.css_first(".jet-listing-dynamic-repeater__items")
-    if not container:
-        return
-    for item in container.css(".jet-listing-dynamic-repeater__item"):
-        tds = item.css("td")
-        if "POLÉVKA" in tds[0].text(strip=True).upper():
-            yield Soup(name=tds[1].text())
-        else:
-            yield Lunch(name=tds[1].text(), price=tds[2].text())
-
-
-@restaurant("Srub", "https://www.menicka.cz/api/iframe/?id=5568", Location.Dubina)
-def srub(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("U formana", "https://www.menicka.cz/api/iframe/?id=4405", Location.Dubina)
-def uformana(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Maston", "https://maston.cz/jidelni-listek/", Location.Dubina)
-async def maston(dom, http):
-    srcs = dom.css_first(".attachment-large").attrs["srcset"]
-    img_url = srcs.split(",")[-1].strip().split(" ")[0]
-
-    img = (await http.get(img_url)).content
-    text = await subprocess_check_output(["tesseract", "-l", "ces", "--psm", "4", "-", "-"], img)
-
-    today = datetime.datetime.strftime(datetime.datetime.now(), "%-d%-m")
-    tomorrow = datetime.datetime.strftime(datetime.datetime.now() + datetime.timedelta(days=1), "%-d%-m")
-    capturing = False
-    for line in text.splitlines():
-        txt = line.replace(" ", "").replace(".", "")
-        if txt.endswith(today):
-            capturing = True
-        elif capturing:
-            if "SAMOSTATN" in txt.upper() or tomorrow in txt:
-                break
-            if "POLÉVKA" in line:
-                yield Soup(line.split(":", 1)[1])
-            else:
-                m = re.search(r"((?P<num>\d)\))?\s*(?P<name>.+)(\s*(?P<price>\d+),-)?", line)
-                if m:
-                    yield Lunch(**m.groupdict())
-
-
-@restaurant("Kozlovna U Ježka", "https://www.menicka.cz/api/iframe/?id=5122", Location.Dubina)
-def kozlovna(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Fontána", "https://www.menicka.cz/api/iframe/?id=1456", Location.Dubina)
-def fontana(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Burger & Beer Brothers", "https://www.menicka.cz/api/iframe/?id=7863", Location.Olomouc)
-def bbbrothers(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Café Restaurant Caesar", "https://www.menicka.cz/api/iframe/?id=5293", Location.Olomouc)
-def caesar(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Morgans restaurant", "https://www.menicka.cz/api/iframe/?id=5294", Location.Olomouc)
-def morgans(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("U Mořice", "https://www.menicka.cz/api/iframe/?id=5299", Location.Olomouc)
-def moric(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Kikiriki", "https://www.menicka.cz/api/iframe/?id=5309", Location.Olomouc)
-def kikiriki(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("U Kristýna", "https://www.menicka.cz/api/iframe/?id=5471", Location.Olomouc)
-def kristyn(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Assen", "https://www.menicka.cz/api/iframe/?id=8767", Location.Zabreh)
-def assen(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Bistro Paulus", "https://www.bistro-paulus.cz/poledni-menu/", Location.Olomouc)
-def paulus(dom):
-    current_day = datetime.datetime.now().strftime("%-d.%-m.%Y")
-    for day_dom in dom.css(".section-day"):
-        day = "".join(day_dom.css_first("h3").text(strip=True).split()[1:])
-        if current_day not in day:
+@functools.lru_cache(maxsize=None)
+def restaurants_metadata():
+    """Metadata of all restaurants by name, plugins are imported only if their source can't be scanned."""
+    metadata = {}
+    for path in sorted(PLUGINS_DIR.glob("*.py")):
+        if path.name.startswith("_"):
             continue
+        module = f"{PLUGINS_PACKAGE}.{path.stem}"
+        try:
+            parsers = list(scan_plugin(path))
+        except (ValueError, KeyError, TypeError):
+            # arguments that aren't literals, unknown Location members or arguments restaurant() doesn't take
+            importlib.import_module(module)
+            parsers = [r.parser for r in registry.values() if r.__module__ == module]
+        for parser in parsers:
+            metadata[parser["name"]] = {**parser, "module": module}
 
-        soup_table = day_dom.css("table")[0].css("span")
-        for soup, price in zip(soup_table[::2], soup_table[1::2]):
-            yield Soup(soup.text(strip=True), price.text(strip=True))
-
-        lunch_table = day_dom.css("table")[1].css("span") + day_dom.css("table")[2].css("span")
-        for lunch, price in zip(lunch_table[::2], lunch_table[1::2]):
-            yield Lunch(lunch.text(strip=True), price=price.text(strip=True))
-
-
-@restaurant("Slezska P.U.O.R", "https://www.menicka.cz/api/iframe/?id=1406", Location.Centrum)
-def puor(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Frankie's Pub", "https://www.menicka.cz/api/iframe/?id=7080", Location.Centrum)
-def frankies_pub(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Ostrawica Lokál", "https://www.menicka.cz/api/iframe/?id=8648", Location.Centrum)
-def ostravica_lokal(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Kanteen", "https://www.menicka.cz/api/iframe/?id=8684", Location.Centrum)
-def kanteen(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("Pizza Coloseum Karolina", "https://www.menicka.cz/api/iframe/?id=517", Location.Centrum)
-def coloseum(dom):
-    yield from menicka_parser(dom)
-
-
-@restaurant("IQ Restaurant", "https://www.menicka.cz/api/iframe/?id=1401", Location.Centrum)
-def iq(dom):
-    yield from menicka_parser(dom)
-
+    for name, parser in registry.items():
+        metadata.setdefault(name, {**parser, "module": None})
 
-@restaurant("2 Promile", "https://www.menicka.cz/api/iframe/?id=3486", Location.Centrum)
-def two_promile(dom):
-    yield from menicka_parser(dom)
+    locations = list(Location)
+    return dict(sorted(metadata.items(), key=lambda i: locations.index(i[1]["location"]) if i[1]["location"] else 0))
 
 
-def fix_price(price):
-    if not price:
-        return None
-    if not isinstance(price, str):
-        return int(price)
-    try:
-        sanitized = re.sub("kč", "", price, flags=re.IGNORECASE)
-        sanitized = sanitized.replace(".00", "").strip(string.punctuation + string.whitespace)
-        return int(sanitized)
-    except ValueError as e:
-        print(e)
-    return None
+def load_restaurant(name):
+    if name not in registry:
+        importlib.import_module(restaurants_metadata()[name]["module"])
+    return registry[name]
 
 
-async def gather_restaurants(allowed_restaurants=None):
+async def gather_restaurants(allowed_restaurants=None, profiler=None, transport=None):
     replacements = [
         (re.compile(r"^\s*(Polévka|BUSINESS MENU|business|SALÁT TÝDNE|tip týdne)", re.IGNORECASE), ""),
         (re.compile(r"k menu\s*$"), ""),
@@ -617,13 +498,23 @@ async def gather_restaurants(allowed_restaurants=None):
             return "windows-1250"
         return "utf-8"
 
-    client = httpx.AsyncClient(default_encoding=detect_encoding, headers={"User-Agent": USER_AGENT}, timeout=15)
+    client = httpx.AsyncClient(
+        default_encoding=detect_encoding,
+        headers={"User-Agent": USER_AGENT},
+        timeout=15,
+        transport=transport or transport_from_env(),
+    )
 
     def cleanup(restaurant):
         def fix_name(name):
             name = unescape(name)
             for pattern, replacement in replacements:
-                name = pattern.sub(replacement, name)
+                if profiler:
+                    start = time.perf_counter()
+                    name = pattern.sub(replacement, name)
+                    profiler.regexp(pattern.pattern, time.perf_counter() - start)
+                else:
+                    name = pattern.sub(replacement, name)
             name = name.strip(string.punctuation + string.whitespace + string.digits + "–—\xa0")
             uppers = len(UPPER_REGEXP.findall(name))
             if uppers > len(name) / 2:
@@ -652,8 +543,12 @@ async def gather_restaurants(allowed_restaurants=None):
         return restaurant
 
     async def collect(parser):
+        def stage(name):
+            return profiler.stage(parser.parser["name"], name) if profiler else nullcontext()
+
         start = time.time()
         res = {
+            "id": parser.parser["name"],
             "name": parser.parser["title"],
             "url": parser.parser["url"],
             "location": parser.parser["location"],
@@ -665,7 +560,8 @@ async def gather_restaurants(allowed_restaurants=None):
             args = {}
             arg_names = parser.parser["args"]
             if "res" in arg_names or "dom" in arg_names:
-                response = await client.get(parser.parser["url"])
+                with stage("fetch"):
+                    response = await client.get(parser.parser["url"])
                 if "res" in arg_names:
                     args["res"] = response.text
                 elif "dom" in arg_names:
@@ -674,27 +570,30 @@ async def gather_restaurants(allowed_restaurants=None):
                 args["http"] = client
             html_request_time = time.time() - start
             start = time.time()
-            parsed = parser(**args)
-            if inspect.isasyncgen(parsed):
-                parsed = [i async for i in parsed]
-            for item in parsed or []:
-                if isinstance(item, Soup):
-                    soups.append(item)
-                elif isinstance(item, Lunch):
-                    lunches.append(item)
-                else:
-                    raise "Unsupported item"
+            # parsers receiving http fetch their additional resources during this stage
+            with stage("parse"):
+                parsed = parser(**args)
+                if inspect.isasyncgen(parsed):
+                    parsed = [i async for i in parsed]
+                for item in parsed or []:
+                    if isinstance(item, Soup):
+                        soups.append(item)
+                    elif isinstance(item, Lunch):
+                        lunches.append(item)
+                    else:
+                        raise "Unsupported item"
             match_time = time.time() - start
-            return cleanup(
-                {
-                    **res,
-                    "lunches": lunches,
-                    "soups": soups,
-                    "elapsed": html_request_time + match_time,
-                    "elapsed_html_request": html_request_time,
-                    "elapsed_parsing": match_time,
-                }
-            )
+            with stage("cleanup"):
+                return cleanup(
+                    {
+                        **res,
+                        "lunches": lunches,
+                        "soups": soups,
+                        "elapsed": html_request_time + match_time,
+                        "elapsed_html_request": html_request_time,
+                        "elapsed_parsing": match_time,
+                    }
+                )
         except:  # noqa: E722
             return {
                 **res,
@@ -704,36 +603,78 @@ async def gather_restaurants(allowed_restaurants=None):
                 "elapsed_parsing": 0,
             }
 
-    restaurants = [obj for _, obj in globals().items() if hasattr(obj, "parser")]
-    if not allowed_restaurants:
-        allowed_restaurants = [r.parser["name"] for r in restaurants]
-
-    return await asyncio.gather(*[collect(r) for r in restaurants if r.parser["name"] in allowed_restaurants])
+    restaurants = [name for name in restaurants_metadata() if not allowed_restaurants or name in allowed_restaurants]
+    async with client:
+        if profiler and profiler.exclusive:
+            return [await collect(load_restaurant(name)) for name in restaurants]
+        return await asyncio.gather(*[collect(load_restaurant(name)) for name in restaurants])
 
 
-if __name__ == "__main__":
+def main():
     import argparse
+    import dataclasses
+    import json
+
+    from profiling import Profiler, format_report
+    from recording import RecordingTransport, ReplayTransport
 
     p = argparse.ArgumentParser()
     p.add_argument("restaurant", nargs="*")
     p.add_argument("--sort", "-s", choices=["error", "time"], default="error")
+    p.add_argument("--profile", action="store_true", help="collect cProfile and tracemalloc data per parser")
+    p.add_argument("--repeat", type=int, default=1, help="run the parsers N times")
+    p.add_argument("--json", action="store_true", help="print results and the profile as JSON")
+    recording = p.add_mutually_exclusive_group()
+    recording.add_argument("--record", metavar="DIR", help="store upstream responses to the directory")
+    recording.add_argument("--replay", metavar="DIR", help="use upstream responses stored by --record")
     args = p.parse_args()
 
     logging.basicConfig(format="[%(asctime)s] %(levelname)s %(name)s - %(message)s", level=logging.INFO)
 
-    restaurants = asyncio.run(gather_restaurants(args.restaurant))
+    transport = None
+    if args.record:
+        transport = RecordingTransport(args.record)
+    elif args.replay:
+        transport = ReplayTransport(args.replay)
+
+    profiler = None
+    if args.profile or args.repeat > 1:
+        profiler = Profiler(cprofile=args.profile, memory=args.profile)
+
+    async def run():
+        for _ in range(args.repeat):
+            restaurants = await gather_restaurants(args.restaurant, profiler=profiler, transport=transport)
+        return restaurants
+
+    restaurants = asyncio.run(run())
+
+    exit_code = int(any("error" in r for r in restaurants))
+    if args.json:
+
+        def default(o):
+            if dataclasses.is_dataclass(o):
+                return dataclasses.asdict(o)
+            raise TypeError
+
+        print(
+            json.dumps(
+                {"restaurants": restaurants, "profile": profiler.report() if profiler else None},
+                default=default,
+                ensure_ascii=False,
+                indent=2,
+            )
+        )
+        exit(exit_code)
 
     sorters = {
         "time": lambda r: r["elapsed"],
         "error": lambda r: ("error" in r, len(r.get("lunches", [])) == 0),
     }
 
-    exit_code = 0
     for restaurant in sorted(restaurants, key=sorters[args.sort]):
         print()
         print(restaurant["name"], f"({restaurant['elapsed']:.3}s)")
         if "error" in restaurant:
-            exit_code = 1
             print(restaurant["error"])
         else:
             for soup in restaurant["soups"]:
@@ -741,4 +682,15 @@ if __name__ == "__main__":
             for lunch in restaurant["lunches"]:
                 print(" ", lunch)
 
+    if profiler:
+        print()
+        print(format_report(profiler.report()))
+
     exit(exit_code)
+
+
+if __name__ == "__main__":
+    # plugins register themselves into the imported "lunches" module, not into this __main__ one
+    from lunches import main
+
+    main()
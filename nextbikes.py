@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import logging
+import time
+
+import httpx
+
+from recording import transport_from_env
+
+FEED_URL = "https://api.nextbike.net/maps/nextbike-live.json?city=271"
+# station name in the feed -> name displayed in the page
+STATIONS = {
+    "P-MSIC - Viva": "Viva",
+    "P-MSIC - Piano": "Piano",
+    "P-Koleje VŠB - vstup do lesoparku": "Koleje bus",
+    "P-koleje VŠB": "Koleje",
+}
+CACHE_KEY = "nextbikes.json"
+INTERVAL = 60
+# the last good snapshot is served while the feed is unavailable, for at most this long
+STALE_TTL = 60 * 60
+# failures of the feed, the response or its content
+FEED_ERRORS = (httpx.HTTPError, ValueError, KeyError)
+
+logger = logging.getLogger(__name__)
+refresh_lock = asyncio.Lock()
+# failed fetches aren't retried by every request waiting for the lock
+retry_at = 0
+
+
+def stations_snapshot(feed):
+    counts = {}
+    for country in feed["countries"]:
+        for city in country["cities"]:
+            for place in city["places"]:
+                if place["name"] in STATIONS:
+                    counts[place["name"]] = place["bikes_available_to_rent"]
+
+    return {
+        "fetched": int(time.time()),
+        "stations": [{"name": name, "count": counts[key]} for key, name in STATIONS.items() if counts.get(key)],
+    }
+
+
+async def fetch_stations(http):
+    response = await http.get(FEED_URL)
+    response.raise_for_status()
+    return stations_snapshot(response.json())
+
+
+def fresh(body):
+    return body and json.loads(body)["fetched"] > time.time() - INTERVAL
+
+
+async def nextbikes_snapshot(cache, http):
+    """Serialized snapshot of our stations, the feed is downloaded at most once per INTERVAL.
+
+    The last good snapshot is served when the feed fails, only the first fetch errors out.
+    """
+    global retry_at
+
+    body = await cache.get(CACHE_KEY)
+    if fresh(body):
+        return body
+
+    async with refresh_lock:
+        # other request might have refreshed it while we were waiting
+        body = await cache.get(CACHE_KEY)
+        if fresh(body) or (body and time.monotonic() < retry_at):
+            return body
+        try:
+            snapshot = await fetch_stations(http)
+        except FEED_ERRORS as e:
+            if not body:
+                raise
+            logger.warning("Nextbike feed unavailable, serving the last snapshot: %r", e)
+            retry_at = time.monotonic() + INTERVAL
+            return body
+        body = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode()
+        await cache.set(CACHE_KEY, body, ex=STALE_TTL)
+    return body
+
+
+if __name__ == "__main__":
+    from pprint import pprint
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport_from_env()) as http:
+            pprint(await fetch_stations(http))
+
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+import asyncio
+import hashlib
+import logging
+import os
+import shutil
+from dataclasses import dataclass
+
+# ImageMagick 7 ships magick, older versions only convert
+MAGICK = shutil.which("magick") or "convert"
+LANGUAGE = "ces"
+# the layout pass only has to find the lines, the region of interest is then read in a higher resolution
+LAYOUT_WIDTH = 800
+OCR_WIDTH = 2000
+# padding around the region of interest in OCR_WIDTH pixels
+PADDING = 10
+OCR_CONCURRENCY = int(os.environ.get("OCR_CONCURRENCY", 2))
+CACHE_SIZE = 16
+
+logger = logging.getLogger(__name__)
+semaphore = asyncio.Semaphore(OCR_CONCURRENCY)
+# running or finished OCR tasks, so concurrent and repeated refreshes of the same image share the work
+tasks = {}
+
+
+@dataclass
+class Line:
+    text: str
+    top: int
+    bottom: int
+
+
+async def run(cmd, input):
+    p = await asyncio.create_subprocess_exec(*cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+    return (await p.communicate(input))[0]
+
+
+async def preprocess(image, width, crop=None, binarize=False):
+    """Grayscale image shrunk to the width, optionally cropped to (top, height) and binarized.
+
+    Smaller images keep their size, enlarging them only adds work for tesseract.
+
+    Crop without the height keeps everything below the top.
+    """
+    cmd = [MAGICK, "-", "-colorspace", "Gray", "-resize", f"{width}x>"]
+    if crop:
+        top, height = crop
+        if height:
+            cmd += ["-crop", f"{width}x{height}+0+{top}", "+repage"]
+        else:
+            cmd += ["-gravity", "North", "-chop", f"0x{top}"]
+    if binarize:
+        cmd += ["-normalize", "-threshold", "60%"]
+    # resizing a large photo takes a core as well
+    async with semaphore:
+        return await run([*cmd, "png:-"], image)
+
+
+async def tesseract(image, *args):
+    async with semaphore:
+        out = await run(["tesseract", "-l", LANGUAGE, "--psm", "4", "--dpi", "300", "-", "-", *args], image)
+    return out.decode("utf-8")
+
+
+def parse_tsv(tsv):
+    """Lines with their vertical position from the tesseract tsv output."""
+    lines = {}
+    for row in tsv.splitlines()[1:]:
+        cols = row.split("\t")
+        if len(cols) < 12 or cols[0] != "5" or not cols[11].strip():
+            continue
+        top, height = int(cols[7]), int(cols[9])
+        line = lines.setdefault(tuple(cols[2:5]), Line("", top, top + height))
+        line.text = f"{line.text} {cols[11]}".strip()
+        line.top = min(line.top, top)
+        line.bottom = max(line.bottom, top + height)
+    return sorted(lines.values(), key=lambda line: line.top)
+
+
+def cached(key, coro):
+    task = tasks.get(key)
+    if task is None or (task.done() and (task.cancelled() or task.exception())):
+        while len(tasks) >= CACHE_SIZE:
+            tasks.pop(next(iter(tasks)))
+        task = tasks[key] = asyncio.ensure_future(coro())
+    return asyncio.shield(task)
+
+
+async def image_width(image):
+    async def identify():
+        # -ping reads just the header
+        return int(await run([MAGICK, "-ping", "-", "-format", "%w", "info:"], image))
+
+    return await cached(("width", hashlib.sha1(image).hexdigest()), identify)
+
+
+async def layout(image):
+    async def recognize():
+        return parse_tsv(await tesseract(await preprocess(image, LAYOUT_WIDTH), "tsv"))
+
+    return await cached(("layout", hashlib.sha1(image).hexdigest()), recognize)
+
+
+async def ocr(image, crop=None, binarize=False):
+    async def recognize():
+        return await tesseract(await preprocess(image, OCR_WIDTH, crop, binarize))
+
+    return await cached(("ocr", hashlib.sha1(image).hexdigest(), crop, binarize), recognize)
+
+
+async def ocr_block(image, is_start, is_end, binarize=False):
+    """Text of the block starting with the line matching is_start up to the one matching is_end.
+
+    The lines are located by a cheap low resolution pass, then only the block is recognized in full resolution.
+    Whole image is recognized when the start of the block isn't found.
+    """
+    lines = await layout(image)
+    start = next((i for i, line in enumerate(lines) if is_start(line.text)), None)
+    if start is None:
+        logger.warning("Block not found in the layout, recognizing the whole image")
+        return await ocr(image, binarize=binarize)
+
+    end = next((line for line in lines[start + 1 :] if is_end(line.text)), None)
+    # widths of the two passes, images narrower than them aren't enlarged
+    width = await image_width(image)
+    scale = min(OCR_WIDTH, width) / min(LAYOUT_WIDTH, width)
+    top = max(0, int(lines[start].top * scale) - PADDING)
+    # the end line is kept in the block, the caller recognizes it as the end marker
+    height = int(end.bottom * scale) + PADDING - top if end else None
+    return await ocr(image, (top, height), binarize)
+
+
+async def evaluate(fixtures, binarize=False):
+    """Compares recognition of the whole image and of the block with expected texts.
+
+    Fixtures are images of Maston menus named by the day, e.g. 2024-10-14.jpg, with the expected text
+    of that day in 2024-10-14.txt, see fixtures/maston. Real menus are saved from the largest image
+    of the srcset on https://maston.cz/jidelni-listek/.
+    """
+    import datetime
+    import difflib
+    import resource
+    from pathlib import Path
+
+    from restaurants.dubina import maston_markers
+
+    def cpu():
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+    def block(text, is_start, is_end):
+        lines = []
+        for line in text.splitlines():
+            if is_start(line):
+                lines = [line]
+            elif lines:
+                if is_end(line):
+                    break
+                lines.append(line)
+        return "\n".join(line for line in lines if line.strip())
+
+    for path in sorted(Path(fixtures).iterdir()):
+        if path.suffix not in (".png", ".jpg", ".jpeg"):
+            continue
+        image = path.read_bytes()
+        expected = path.with_suffix(".txt").read_text().strip()
+        is_start, is_end = maston_markers(datetime.date.fromisoformat(path.stem))
+
+        tasks.clear()
+        results = {}
+        start = cpu()
+        full = await tesseract(image)
+        results["full page"] = (block(full, is_start, is_end), cpu() - start)
+
+        start = cpu()
+        roi = await ocr_block(image, is_start, is_end, binarize)
+        results["block"] = (block(roi, is_start, is_end), cpu() - start)
+
+        print(path.name)
+        for name, (text, elapsed) in results.items():
+            accuracy = difflib.SequenceMatcher(None, expected, text).ratio()
+            print(f"  {name:<10} accuracy {accuracy:6.1%}  cpu {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(description="Measure OCR accuracy and CPU time against saved fixtures")
+    p.add_argument("fixtures")
+    p.add_argument("--binarize", action="store_true")
+    args = p.parse_args()
+
+    asyncio.run(evaluate(args.fixtures, args.binarize))
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+
+STAGES = ["fetch", "parse", "cleanup"]
+# fetch mostly waits for the network, the event loop would fill its profile with other coroutines
+PROFILED_STAGES = ("parse", "cleanup")
+# runtime toggle, e.g. `redis-cli set lunch.profile_sample_rate 0.1` profiles every 10th refresh
+SAMPLE_RATE_KEY = "lunch.profile_sample_rate"
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """Collects per restaurant and stage timings, optionally with cProfile and tracemalloc data.
+
+    cProfile data of a restaurant covers its parse and cleanup stages.
+
+    cProfile and tracemalloc can't tell concurrently running parsers apart,
+    so restaurants are collected one by one when either of them is enabled.
+    """
+
+    def __init__(self, cprofile=False, memory=False):
+        self.cprofile = cprofile
+        self.memory = memory
+        self.times = defaultdict(lambda: defaultdict(list))
+        self.peaks = defaultdict(lambda: defaultdict(int))
+        self.profiles = defaultdict(cProfile.Profile)
+        self.regexps = defaultdict(float)
+
+    @property
+    def exclusive(self):
+        return self.cprofile or self.memory
+
+    @contextmanager
+    def stage(self, restaurant, stage):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        profile = self.profiles[restaurant] if self.cprofile and stage in PROFILED_STAGES else None
+        if profile:
+            profile.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[restaurant][stage].append(time.perf_counter() - start)
+            if profile:
+                profile.disable()
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                self.peaks[restaurant][stage] = max(self.peaks[restaurant][stage], peak)
+
+    def regexp(self, pattern, elapsed):
+        self.regexps[pattern] += elapsed
+
+    def top_functions(self, restaurant, limit=10):
+        if restaurant not in self.profiles:
+            return []
+        stats = pstats.Stats(self.profiles[restaurant], stream=io.StringIO())
+        functions = sorted(stats.stats.items(), key=lambda i: i[1][3], reverse=True)[:limit]
+        return [
+            {
+                "function": f"{file}:{line}({name})",
+                "calls": calls,
+                "tottime": tottime,
+                "cumtime": cumtime,
+            }
+            for (file, line, name), (_, calls, tottime, cumtime, _) in functions
+        ]
+
+    def report(self, functions=10):
+        restaurants = []
+        for restaurant, stages in self.times.items():
+            entry = {"name": restaurant, "stages": {}}
+            for stage in STAGES:
+                times = stages.get(stage)
+                if not times:
+                    continue
+                entry["stages"][stage] = {
+                    "runs": len(times),
+                    "mean": sum(times) / len(times),
+                    "min": min(times),
+                    "max": max(times),
+                }
+                if self.memory:
+                    entry["stages"][stage]["peak_memory"] = self.peaks[restaurant][stage]
+            entry["total"] = sum(s["mean"] for s in entry["stages"].values())
+            entry["cpu"] = sum(s["mean"] for name, s in entry["stages"].items() if name != "fetch")
+            if self.cprofile:
+                entry["functions"] = self.top_functions(restaurant, functions)
+            restaurants.append(entry)
+
+        return {
+            "restaurants": sorted(restaurants, key=lambda r: r["cpu"], reverse=True),
+            "regexps": [
+                {"pattern": pattern, "elapsed": elapsed}
+                for pattern, elapsed in sorted(self.regexps.items(), key=lambda i: i[1], reverse=True)
+            ],
+        }
+
+
+def format_report(report, limit=None):
+    lines = [f"{'restaurant':<20} {'fetch ms':>10} {'parse ms':>10} {'cleanup ms':>10} {'peak KiB':>10}"]
+    for r in report["restaurants"][:limit]:
+        cols = [f"{r['stages'][s]['mean'] * 1000:10.2f}" if s in r["stages"] else f"{'-':>10}" for s in STAGES]
+        peak = max((s.get("peak_memory", 0) for s in r["stages"].values()), default=0)
+        lines.append(f"{r['name']:<20} {' '.join(cols)} {peak / 1024:10.1f}")
+        for f in r.get("functions", [])[:5]:
+            lines.append(f"    {f['cumtime'] * 1000:8.2f}ms {f['calls']:6} {f['function']}")
+
+    if report["regexps"]:
+        lines.append("")
+        lines.append("cleanup regexps (total)")
+        for r in report["regexps"]:
+            lines.append(f"    {r['elapsed'] * 1000:8.2f}ms {r['pattern']}")
+    return "\n".join(lines)
+
+
+async def sample_refresh(redis_client):
+    """Returns a Profiler when this refresh is picked for sampling, otherwise None."""
+    rate = await redis_client.get(SAMPLE_RATE_KEY) or os.environ.get("LUNCH_PROFILE_SAMPLE_RATE", 0)
+    try:
+        rate = float(rate)
+    except ValueError:
+        logger.warning("Invalid profile sample rate: %s", rate)
+        return None
+    if random.random() < rate:
+        return Profiler()
+    return None
@@ -2,13 +2,41 @@
 import asyncio
 import datetime
 import itertools
+import json
+import os
 from time import time
 
 import httpx
 from selectolax.parser import HTMLParser
 
+from recording import transport_from_env
 
-async def public_transport_connections(sources, destinations):
+# route set -> (sources, destinations) of the journey there, the journey back swaps them
+ROUTE_SETS = {
+    "default": (["Václava Jiřikovského"], ["Hlavní třída", "Rektorát VŠB", "Pustkovecká", "Poruba,Studentské koleje"]),
+}
+if os.environ.get("PUBLIC_TRANSPORT_ROUTES"):
+    ROUTE_SETS = json.loads(os.environ["PUBLIC_TRANSPORT_ROUTES"])
+# served when the request doesn't name one
+DEFAULT_ROUTE_SET = next(iter(ROUTE_SETS))
+DIRECTIONS = ("there", "back")
+INTERVAL = 60
+
+refresh_lock = asyncio.Lock()
+
+
+def default_direction():
+    return "back" if datetime.datetime.now().hour >= 12 else "there"
+
+
+def routes(route_set, direction):
+    sources, destinations = ROUTE_SETS[route_set]
+    if direction == "back":
+        sources, destinations = destinations, sources
+    return sources, destinations
+
+
+async def public_transport_connections(sources, destinations, http=None):
     async def fetch(http, source, destination):
         url = f"https://idos.cz/odis/spojeni/vysledky/?f={source}&fc=303003&t={destination}&tc=303003"
         start = time()
@@ -31,7 +59,7 @@ async def public_transport_connections(sources, destinations):
                 def to_datetime(s):
                     date = datetime.datetime.now()
                     hour, minute = s.split(":")
-                    return date.replace(hour=int(hour), minute=int(minute), second=0)
+                    return int(date.replace(hour=int(hour), minute=int(minute), second=0, microsecond=0).timestamp())
 
                 def p(node):
                     return {
@@ -51,9 +79,12 @@ async def public_transport_connections(sources, destinations):
         return links
 
     searches = list(itertools.product(sources, destinations))
-    async with httpx.AsyncClient() as http:
+    if http:
         results = await asyncio.gather(*[fetch(http, *s) for s in searches])
-        all_links = list(itertools.chain(*results))
+    else:
+        async with httpx.AsyncClient(transport=transport_from_env()) as http:
+            results = await asyncio.gather(*[fetch(http, *s) for s in searches])
+    all_links = list(itertools.chain(*results))
 
     def time_to_num(t):
         return t
@@ -67,12 +98,30 @@ async def public_transport_connections(sources, destinations):
     return all_links
 
 
+async def connections_snapshot(cache, http, route_set, direction):
+    """Serialized connections of the route set, searched at most once per INTERVAL."""
+    key = f"public_transport.{route_set}.{direction}"
+    body = await cache.get(key)
+    if body:
+        return body
+
+    async with refresh_lock:
+        # other request might have refreshed it while we were waiting
+        body = await cache.get(key)
+        if not body:
+            snapshot = {
+                "fetched": int(time()),
+                "route_set": route_set,
+                "direction": direction,
+                "connections": await public_transport_connections(*routes(route_set, direction), http),
+            }
+            body = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode()
+            await cache.set(key, body, ex=INTERVAL)
+    return body
+
+
 if __name__ == "__main__":
     from pprint import pprint
 
-    result = asyncio.run(
-        public_transport_connections(
-            ["Václava Jiřikovského"], ["Hlavní třída", "Rektorát VŠB", "Pustkovecká", "Poruba,Studentské koleje"]
-        )
-    )
+    result = asyncio.run(public_transport_connections(*routes(DEFAULT_ROUTE_SET, default_direction())))
     pprint(result)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import httpx
+
+# headers describing the original transfer, the recorded body is already decoded
+SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def response_path(directory, request):
+    digest = hashlib.sha1(f"{request.method} {request.url}".encode()).hexdigest()
+    return Path(directory) / digest
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Stores every upstream response so the same refresh can be replayed offline later."""
+
+    def __init__(self, directory, transport=None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        response = await self.transport.handle_async_request(request)
+        body = await response.aread()
+        headers = [(k, v) for k, v in response.headers.multi_items() if k.lower() not in SKIPPED_HEADERS]
+
+        path = response_path(self.directory, request)
+        path.with_suffix(".body").write_bytes(body)
+        path.with_suffix(".json").write_text(
+            json.dumps(
+                {"method": request.method, "url": str(request.url), "status": response.status_code, "headers": headers}
+            )
+        )
+        return httpx.Response(response.status_code, headers=headers, content=body)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves responses stored by RecordingTransport, unknown requests get 404."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    async def handle_async_request(self, request):
+        path = response_path(self.directory, request)
+        try:
+            meta = json.loads(path.with_suffix(".json").read_text())
+        except FileNotFoundError:
+            return httpx.Response(404, text=f"{request.url} not recorded")
+        return httpx.Response(meta["status"], headers=meta["headers"], content=path.with_suffix(".body").read_bytes())
+
+
+def transport_from_env():
+    """Transport of upstream requests, LUNCH_RECORD_DIR or LUNCH_REPLAY_DIR take the responses from/to disk."""
+    if os.environ.get("LUNCH_RECORD_DIR"):
+        return RecordingTransport(os.environ["LUNCH_RECORD_DIR"])
+    if os.environ.get("LUNCH_REPLAY_DIR"):
+        return ReplayTransport(os.environ["LUNCH_REPLAY_DIR"])
+    return None
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import asyncio
+import logging
+import os
+import pickle
+import socket
+import time
+import uuid
+
+import redis.asyncio as redis
+
+import profiling
+from lunches import Location, gather_restaurants, restaurants_metadata
+
+GROUP = "refresh"
+DEAD_LETTER_STREAM = "lunch.jobs.dead"
+# jobs not acknowledged within the timeout (e.g. crashed worker) are claimed by another worker
+VISIBILITY_TIMEOUT = int(os.environ.get("REFRESH_VISIBILITY_TIMEOUT", 45))
+MAX_DELIVERIES = int(os.environ.get("REFRESH_MAX_DELIVERIES", 3))
+WAIT_TIMEOUT = int(os.environ.get("REFRESH_WAIT_TIMEOUT", 60))
+# longest blocking read for the results, the socket timeout of the client has to be above it
+POLL_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+
+def job_stream(location):
+    return f"lunch.jobs.{location.name}"
+
+
+def batch_key(batch):
+    return f"lunch.batch.{batch}"
+
+
+def failed(meta, error):
+    return {
+        "id": meta["name"],
+        "name": meta["title"],
+        "url": meta["url"],
+        "location": meta["location"],
+        "error": error,
+        "elapsed": 0,
+        "elapsed_html_request": 0,
+        "elapsed_parsing": 0,
+    }
+
+
+async def refresh(redis_client, allowed_restaurants=None, timeout=WAIT_TIMEOUT):
+    """Queues a job per restaurant for the refresh workers and waits for their results."""
+    metadata = {
+        name: meta
+        for name, meta in restaurants_metadata().items()
+        if not allowed_restaurants or name in allowed_restaurants
+    }
+    batch = uuid.uuid4().hex
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for name, meta in metadata.items():
+            pipe.xadd(job_stream(meta["location"]), {"restaurant": name, "batch": batch}, maxlen=10000)
+        await pipe.execute()
+
+    results = {}
+    deadline = time.monotonic() + timeout
+    while len(results) < len(metadata):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        item = await redis_client.blpop([batch_key(batch)], timeout=max(1, min(POLL_INTERVAL, int(remaining))))
+        if item:
+            result = pickle.loads(item[1])
+            # a slow job might have been claimed and finished by two workers
+            results.setdefault(result["id"], result)
+    await redis_client.delete(batch_key(batch))
+
+    return [results.get(name) or failed(meta, "Refresh worker timed out") for name, meta in metadata.items()]
+
+
+class Worker:
+    def __init__(self, redis_client, locations, concurrency=10):
+        self.redis = redis_client
+        self.streams = [job_stream(location) for location in locations]
+        self.concurrency = concurrency
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.running = 0
+
+    async def create_groups(self):
+        for stream in self.streams:
+            try:
+                await self.redis.xgroup_create(stream, GROUP, id="0", mkstream=True)
+            except redis.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def claim_stale(self, stream, count):
+        """Takes over jobs of workers that didn't acknowledge them in time, gives up after MAX_DELIVERIES."""
+        if count <= 0:
+            return []
+        _, messages, *_ = await self.redis.xautoclaim(
+            stream, GROUP, self.consumer, min_idle_time=VISIBILITY_TIMEOUT * 1000, count=count
+        )
+        jobs = []
+        for message_id, fields in messages:
+            pending = await self.redis.xpending_range(stream, GROUP, min=message_id, max=message_id, count=1)
+            if pending and pending[0]["times_delivered"] > MAX_DELIVERIES:
+                logger.error("Giving up job %s %s", message_id, fields)
+                await self.dead_letter(stream, message_id, fields)
+            else:
+                jobs.append((stream, message_id, fields))
+        return jobs
+
+    async def read(self, stream, count):
+        response = await self.redis.xreadgroup(GROUP, self.consumer, {stream: ">"}, count=count)
+        return [(stream, message_id, fields) for _, messages in response or [] for message_id, fields in messages]
+
+    async def dead_letter(self, stream, message_id, fields):
+        name = fields[b"restaurant"].decode()
+        meta = restaurants_metadata().get(name)
+        if meta:
+            result = failed(meta, f"Refresh failed after {MAX_DELIVERIES} attempts")
+            await self.push_result(fields[b"batch"].decode(), result)
+        await self.redis.xadd(DEAD_LETTER_STREAM, {**fields, b"stream": stream}, maxlen=1000)
+        await self.redis.xack(stream, GROUP, message_id)
+
+    async def push_result(self, batch, result):
+        key = batch_key(batch)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, pickle.dumps(result))
+            pipe.expire(key, WAIT_TIMEOUT * 2)
+            await pipe.execute()
+
+    async def process(self, stream, message_id, fields):
+        name = fields[b"restaurant"].decode()
+        start = time.time()
+        profiler = await profiling.sample_refresh(self.redis)
+        result = (await gather_restaurants([name], profiler=profiler))[0]
+        logger.info("%s refreshed in %.2fs%s", name, time.time() - start, " with error" if "error" in result else "")
+        if profiler:
+            logger.info("Sampled refresh profile:\n%s", profiling.format_report(profiler.report()))
+        attempt = int(fields.get(b"attempt", 1))
+        if "error" in result and attempt < MAX_DELIVERIES:
+            # most failures are transient (e.g. upstream timeouts), the result is waited for so retry right away
+            logger.warning("Retrying %s, attempt %d of %d", name, attempt + 1, MAX_DELIVERIES)
+            await self.requeue(stream, message_id, {**fields, b"attempt": attempt + 1})
+            return
+        await self.push_result(fields[b"batch"].decode(), result)
+        await self.redis.xack(stream, GROUP, message_id)
+
+    async def requeue(self, stream, message_id, fields):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(stream, fields, maxlen=10000)
+            pipe.xack(stream, GROUP, message_id)
+            await pipe.execute()
+
+    async def process_bounded(self, semaphore, job):
+        try:
+            await self.process(*job)
+        except Exception:
+            # the job stays pending and is claimed again after VISIBILITY_TIMEOUT
+            logger.exception("Job %s failed", job[1])
+        finally:
+            self.running -= 1
+            semaphore.release()
+
+    async def run(self):
+        await self.create_groups()
+        logger.info("Worker %s consuming %s", self.consumer, ", ".join(self.streams))
+        # jobs run as tasks bounded by the semaphore, so a slow restaurant doesn't hold back taking the next jobs
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        while True:
+            # wait for a free slot
+            async with semaphore:
+                free = self.concurrency - self.running
+
+            jobs = []
+            for stream in self.streams:
+                jobs += await self.claim_stale(stream, free - len(jobs))
+
+            # COUNT of XREADGROUP applies to each stream, so the free slots are spent stream by stream
+            for stream in self.streams:
+                if len(jobs) < free:
+                    jobs += await self.read(stream, free - len(jobs))
+
+            if not jobs:
+                if free >= len(self.streams):
+                    # at most one job of each stream fits the free slots
+                    response = await self.redis.xreadgroup(
+                        GROUP, self.consumer, dict.fromkeys(self.streams, ">"), count=1, block=5000
+                    )
+                    for stream, messages in response or []:
+                        jobs += [(stream.decode(), message_id, fields) for message_id, fields in messages]
+                elif tasks:
+                    # too few slots to block on all streams, poll again once a job finishes
+                    await asyncio.wait(tasks, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+                else:
+                    await asyncio.sleep(1)
+
+            for job in jobs:
+                await semaphore.acquire()
+                self.running += 1
+                task = asyncio.create_task(self.process_bounded(semaphore, job))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+
+def main():
+    import argparse
+
+    p = argparse.ArgumentParser()
+    p.add_argument(
+        "--location",
+        "-l",
+        action="append",
+        choices=[location.name for location in Location],
+        help="consume only jobs of the location, can be repeated",
+    )
+    p.add_argument("--concurrency", "-c", type=int, default=10)
+    args = p.parse_args()
+
+    logging.basicConfig(format="[%(asctime)s] %(levelname)s %(name)s - %(message)s", level=logging.INFO)
+
+    locations = [Location[name] for name in args.location] if args.location else list(Location)
+    redis_client = redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost"))
+    asyncio.run(Worker(redis_client, locations, args.concurrency).run())
+
+
+if __name__ == "__main__":
+    main()
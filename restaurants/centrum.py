@@ -0,0 +1,36 @@
+from lunches import Location, menicka_parser, restaurant
+
+
+@restaurant("Slezska P.U.O.R", "https://www.menicka.cz/api/iframe/?id=1406", Location.Centrum)
+def puor(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Frankie's Pub", "https://www.menicka.cz/api/iframe/?id=7080", Location.Centrum)
+def frankies_pub(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Ostrawica Lokál", "https://www.menicka.cz/api/iframe/?id=8648", Location.Centrum)
+def ostravica_lokal(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Kanteen", "https://www.menicka.cz/api/iframe/?id=8684", Location.Centrum)
+def kanteen(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Pizza Coloseum Karolina", "https://www.menicka.cz/api/iframe/?id=517", Location.Centrum)
+def coloseum(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("IQ Restaurant", "https://www.menicka.cz/api/iframe/?id=1401", Location.Centrum)
+def iq(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("2 Promile", "https://www.menicka.cz/api/iframe/?id=3486", Location.Centrum)
+def two_promile(dom):
+    yield from menicka_parser(dom)
@@ -0,0 +1,79 @@
+import datetime
+import re
+
+from lunches import Location, Lunch, Soup, menicka_parser, restaurant
+from ocr import ocr_block
+
+
+@restaurant("La Futura", "https://lafuturaostrava.cz/", Location.Dubina)
+def lafutura(dom):
+    # a single css() per row, a MenuSpec can't be faster than this
+    container = dom.css_first(".jet-listing-dynamic-repeater__items")
+    if not container:
+        return
+    for item in container.css(".jet-listing-dynamic-repeater__item"):
+        tds = item.css("td")
+        t = Soup if "POLÉVKA" in tds[0].text(strip=True).upper() else Lunch
+        yield t(name=tds[1].text(), price=tds[2].text())
+
+
+@restaurant("Srub", "https://www.menicka.cz/api/iframe/?id=5568", Location.Dubina)
+def srub(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("U formana", "https://www.menicka.cz/api/iframe/?id=4405", Location.Dubina)
+def uformana(dom):
+    yield from menicka_parser(dom)
+
+
+def maston_markers(day):
+    """Predicates of the first line of the day block and of the line ending it in the OCR output."""
+    today = day.strftime("%-d%-m")
+    tomorrow = (day + datetime.timedelta(days=1)).strftime("%-d%-m")
+
+    def normalize(line):
+        return line.replace(" ", "").replace(".", "")
+
+    def is_start(line):
+        return normalize(line).endswith(today)
+
+    def is_end(line):
+        txt = normalize(line)
+        return "SAMOSTATN" in txt.upper() or tomorrow in txt
+
+    return is_start, is_end
+
+
+@restaurant("Maston", "https://maston.cz/jidelni-listek/", Location.Dubina)
+async def maston(dom, http):
+    srcs = dom.css_first(".attachment-large").attrs["srcset"]
+    img_url = srcs.split(",")[-1].strip().split(" ")[0]
+
+    img = (await http.get(img_url)).content
+    is_start, is_end = maston_markers(datetime.date.today())
+    text = await ocr_block(img, is_start, is_end)
+
+    capturing = False
+    for line in text.splitlines():
+        if is_start(line):
+            capturing = True
+        elif capturing:
+            if is_end(line):
+                break
+            if "POLÉVKA" in line:
+                yield Soup(line.split(":", 1)[1])
+            else:
+                m = re.search(r"((?P<num>\d)\))?\s*(?P<name>.+)(\s*(?P<price>\d+),-)?", line)
+                if m:
+                    yield Lunch(**m.groupdict())
+
+
+@restaurant("Kozlovna U Ježka", "https://www.menicka.cz/api/iframe/?id=5122", Location.Dubina)
+def kozlovna(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Fontána", "https://www.menicka.cz/api/iframe/?id=1456", Location.Dubina)
+def fontana(dom):
+    yield from menicka_parser(dom)
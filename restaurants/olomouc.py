@@ -0,0 +1,50 @@
+import datetime
+
+from lunches import Location, Lunch, Soup, menicka_parser, restaurant
+
+
+@restaurant("Burger & Beer Brothers", "https://www.menicka.cz/api/iframe/?id=7863", Location.Olomouc)
+def bbbrothers(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Café Restaurant Caesar", "https://www.menicka.cz/api/iframe/?id=5293", Location.Olomouc)
+def caesar(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Morgans restaurant", "https://www.menicka.cz/api/iframe/?id=5294", Location.Olomouc)
+def morgans(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("U Mořice", "https://www.menicka.cz/api/iframe/?id=5299", Location.Olomouc)
+def moric(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Kikiriki", "https://www.menicka.cz/api/iframe/?id=5309", Location.Olomouc)
+def kikiriki(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("U Kristýna", "https://www.menicka.cz/api/iframe/?id=5471", Location.Olomouc)
+def kristyn(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Bistro Paulus", "https://www.bistro-paulus.cz/poledni-menu/", Location.Olomouc)
+def paulus(dom):
+    current_day = datetime.datetime.now().strftime("%-d.%-m.%Y")
+    for day_dom in dom.css(".section-day"):
+        day = "".join(day_dom.css_first("h3").text(strip=True).split()[1:])
+        if current_day not in day:
+            continue
+
+        soup_table = day_dom.css("table")[0].css("span")
+        for soup, price in zip(soup_table[::2], soup_table[1::2]):
+            yield Soup(soup.text(strip=True), price.text(strip=True))
+
+        lunch_table = day_dom.css("table")[1].css("span") + day_dom.css("table")[2].css("span")
+        for lunch, price in zip(lunch_table[::2], lunch_table[1::2]):
+            yield Lunch(lunch.text(strip=True), price=price.text(strip=True))
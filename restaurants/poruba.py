@@ -0,0 +1,342 @@
+import datetime
+import json
+import re
+
+from selectolax.parser import HTMLParser, Selector
+
+from lunches import (
+    USER_AGENT,
+    Location,
+    Lunch,
+    MenuSpec,
+    Soup,
+    days,
+    fix_price,
+    menicka_parser,
+    restaurant,
+    subprocess_check_output,
+)
+
+
+@restaurant("Bistro IN", "https://bistroin.choiceqr.com/delivery", Location.Poruba)
+def bistroin(dom):
+    data = json.loads(dom.css_first("#__NEXT_DATA__").text())
+
+    for item in data["props"]["app"]["menu"]:
+        ingredients = re.sub(r"Al\. \(.+", "", item["description"])
+        price = item["price"] // 100
+        if "Polévka k menu:" in item["name"]:
+            yield Soup(name=item["name"].split(":")[1], price=price)
+        else:
+            match = re.match(r"^\s*(?P<num>[0-9]+)\s*\.\s*(?P<name>.+)", item["name"])
+            if match:
+                yield Lunch(**match.groupdict(), price=price - 10, ingredients=ingredients)
+
+
+@restaurant("U jarosu", "https://www.ujarosu.cz/cz/denni-menu/", Location.Poruba)
+def u_jarosu(dom):
+    today = datetime.datetime.strftime(datetime.datetime.now(), "%d. %m. %Y")
+    for row in dom.css(".celyden"):
+        parsed_day = row.css_first(".datum").text()
+        if parsed_day == today:
+            records = row.css(".tabulka p")
+            records = [r.text().strip() for r in records]
+            records = [records[i : i + 3] for i in range(0, len(records), 3)]
+            for first, name, price in records:
+                if first == "Polévka":
+                    yield Soup(name)
+                else:
+                    yield Lunch(name, price=price, num=first.split(".")[0])
+
+
+@restaurant("U zlateho lva", "http://www.zlatylev.com/menu_zlaty_lev.html", Location.Poruba)
+def u_zlateho_lva(dom):
+    day_nth = datetime.datetime.today().weekday()
+    text = dom.css_first(".xr_txt.xr_s0").text()
+
+    capturing = False
+    state = "num"
+    for line in text.splitlines():
+        line = line.strip()
+
+        if line.startswith(days[day_nth]):
+            capturing = True
+        elif capturing:
+            if day_nth < 4 and line.startswith(days[day_nth + 1]):
+                break
+            soup_prefix = "Polévka:"
+            if line.startswith(soup_prefix):
+                yield Soup(line.replace(soup_prefix, ""))
+            else:
+                if state == "num":
+                    if re.match(r"^[0-9]+\.", line):
+                        line, name = line.split(".", 1)
+                        food = Lunch(name=name, num=line)
+                        state = "price" if name else "name"
+                elif state == "name":
+                    if line:
+                        food.name = line
+                        state = "price"
+                elif state == "price":  # noqa: SIM102
+                    if re.match(r"^[0-9]+\s*(,-|Kč)$", line):
+                        food.price = line.split(" ")[0]
+                        yield food
+                        state = "num"
+
+
+@restaurant("Globus", "https://www.globus.cz/ostrava/sluzby-a-produkty/restaurace", Location.Poruba)
+def globus(dom):
+    # a single css() per row, a MenuSpec can't be faster than this
+    for row in dom.css(".space-y-2 .flex"):
+        spans = row.css("* > span")
+        price = fix_price(spans[2].text())
+        t = Soup if price < 50 else Lunch
+        yield t(spans[1].text(), price=price)
+
+
+@restaurant("Jacks Burger", "https://www.zomato.com/cs/widgets/daily_menu.php?entity_id=16525845", Location.Poruba)
+def jacks_burger(dom):
+    started = False
+    full_name = ""
+    num = None
+    price = None
+    for el in dom.css(".main-body > div"):
+        if el.css_matches(".line-wider"):
+            break
+        name = el.css_first(".item-name")
+        if name is None:
+            continue
+        name = name.text(strip=True)
+        if "ROZVOZ PŘES" in name.upper() or "---------" in name or "JBB OSTRAVA" in name.upper():
+            continue
+
+        if re.match(r"^[0-9]+\..+", name):
+            if full_name:
+                yield Lunch(name=full_name, price=price, num=num)
+                full_name = ""
+                price = None
+            num = name.split(".")[0]
+
+        full_name += name
+        if not started:
+            if full_name != "Polévka dle denní nabídky":
+                yield Soup(name=full_name)
+            full_name = ""
+            started = True
+        else:
+            price = el.css_first(".item-price")
+            if price:
+                price = price.text(strip=True)
+                if price:
+                    yield Lunch(name=full_name, price=price, num=num)
+                    full_name = ""
+                    price = None
+                    num = None
+
+
+@restaurant("Poklad", "https://dkpoklad.cz/restaurace/", Location.Poruba)
+async def poklad(dom, http):
+    pdf_url = dom.css_first(".restaurace-box .wp-block-file a").attributes["href"]
+    pdf = (await http.get(pdf_url)).content
+    text = await subprocess_check_output(["pdftotext", "-layout", "-", "-"], pdf)
+
+    today = datetime.datetime.strftime(datetime.datetime.now(), "%-d I %-m")
+    tomorrow = datetime.datetime.strftime(datetime.datetime.now() + datetime.timedelta(days=1), "%-d I %-m")
+    capturing = False
+    soup = True
+    item = None
+    for line in text.splitlines():
+        if today in line:
+            capturing = True
+        elif capturing:
+            if tomorrow in line or "NABÍDKA NÁPOJŮ" in line:
+                break
+            if soup:
+                soup = False
+                for s in line.split(" I "):
+                    yield Soup(s)
+            else:
+                print(line)
+                m = re.match(r"^\s*(?P<num>([0-9]+|BUSINESS))\s*\.?\s*(?P<name>.*?) (?P<price>[0-9]+) Kč", line)
+                if m:
+                    if item:
+                        yield Lunch(**item)
+                    item = m.groupdict()
+                elif item:
+                    if not line:
+                        yield Lunch(**item)
+                        item = None
+                    else:
+                        item["name"] += line
+
+    if item:
+        yield Lunch(**item)
+
+
+@restaurant("Trebovicky mlyn", "https://www.trebovickymlyn.cz/denni-menu/", Location.Poruba)
+def trebovicky_mlyn():
+    return [
+        MenuSpec(rows=".soup h2", fields={"name": None}, kind=Soup, limit=1, required=True),
+        MenuSpec(
+            root=".owl-carousel",
+            rows=".menu-post",
+            fields={"name": "h2", "ingredients": "h2 + div", "price": "span"},
+            patterns={"name": r"^(?P<num>[^)]*)\)(?P<name>[^)]*)$", "price": r"^(?P<price>[^,]*)"},
+        ),
+    ]
+
+
+@restaurant("La Strada", "https://www.lastrada.cz/cz/?tpl=plugins/DailyMenu/print&week_shift=", Location.Poruba)
+def lastrada(dom):
+    day_nth = datetime.datetime.today().weekday()
+
+    capturing = False
+    for tr in dom.css("tr"):
+        if tr.css_matches(".day"):
+            capturing = False
+            if days[day_nth] in tr.text() or "Menu na celý týden" in tr.text():
+                capturing = True
+        elif capturing:
+            if tr.css_matches(".highlight"):
+                yield Lunch(name=tr.css_first("td").text(), price=tr.css_first(".price").text())
+
+
+@restaurant("Ellas", "https://www.restauraceellas.cz/", Location.Poruba)
+def ellas(dom):
+    day_nth = datetime.datetime.today().weekday()
+
+    for div in dom.css(".moduletable .custom"):
+        if div.css_first("h3").text(strip=True) != days[day_nth]:
+            continue
+        foods = div.css("p")
+        yield Soup(name=foods[0].text())
+
+        for food in foods[1:]:
+            if food.text():
+                parsed = re.match(
+                    r"\s*(?P<num>[0-9]+)\s*\.\s*(?P<name>.*?)\s*(\([0-9 ,]+\))?\s*(?P<price>[0-9]+),-",  # noqa: E501
+                    food.text(),
+                ).groupdict()
+
+                m = re.match(r"^(?P<name>[A-Z -]+)\s+(?P<ingredients>.*?)$", parsed["name"])
+                if m:
+                    parsed.update(m.groupdict())
+
+                yield Lunch(**parsed)
+
+
+@restaurant("Saloon Pub", "http://www.saloon-pub.cz/cs/denni-nabidka/", Location.Poruba)
+def saloon_pub():
+    def day():
+        return f'#{datetime.datetime.strftime(datetime.datetime.now(), "%Y-%m-%d")} + section'
+
+    return [
+        MenuSpec(root=day, rows=".category-info", fields={"name": None}, kind=Soup, limit=1),
+        MenuSpec(root=day, rows=".main-meal-info", fields={"name": ".meal-name", "price": ".meal-price"}),
+    ]
+
+
+@restaurant("Parlament", "https://www.restauraceparlament.cz/", Location.Poruba)  # codespell:ignore
+def parlament(dom):  # codespell:ignore
+    day_nth = datetime.datetime.today().weekday()
+    txt = dom.css_first(".txt")
+    if not txt:
+        # selectolax crashes on Selector(None, ...)
+        return
+    day = Selector(txt, "div div").text_contains(days[day_nth])
+    if day:
+        day = day.matches[0]
+        yield Soup(day.css_first("* + dt").text())
+        for line in day.css_first("* + dt + p").text().splitlines():
+            m = re.match(r"(?P<num>\d+)\.\s*(?P<name>.*?)(?P<price>\d+),-Kč", line)
+            if m:
+                yield Lunch(**m.groupdict())
+
+
+@restaurant("Plzenka aura", "https://www.plzenkaaura.cz/denni-menu", Location.Poruba)
+def plzenka():
+    return MenuSpec(
+        rows=".list-items > *",
+        sections=("h5", {"POLÉVKA": Soup, "HLAVNÍ JÍDLO": Lunch}),
+        fields={"name": ".modify_item", "ingredients": ".food-info", "price": ".menu-price"},
+    )
+
+
+@restaurant("El Amigo Muerto", "https://www.menicka.cz/api/iframe/?id=5560", Location.Poruba)
+def el_amigo_muerto(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Rusty Bell Pub", "https://www.menicka.cz/api/iframe/?id=1547", Location.Poruba)
+def rusty_bell_pub(dom):
+    foods = list(menicka_parser(dom))
+    if not foods:
+        return
+    yield Soup(foods[1].name)
+    for food in foods[2:]:
+        food.num = None
+        yield food
+
+
+@restaurant("Viktorka", "https://www.menicka.cz/api/iframe/?id=6603", Location.Poruba)
+def viktorka(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Futrovna", "https://www.menicka.cz/api/iframe/?id=7200", Location.Poruba)
+def futrovna(dom):
+    yield from menicka_parser(dom)
+
+
+@restaurant("Kurnik sopa", "https://www.kurniksopahospoda.cz", Location.Poruba)
+def kurniksopa():
+    return MenuSpec(
+        rows="#naCepu-list tr",
+        fields={"beer": ".nazev", "degree": ".stupne", "type": ".typ", "origin": ".puvod"},
+        templates={"name": "{beer} {degree} - {type}, {origin}"},
+    )
+
+
+@restaurant("Sbeerka", "https://sbeerka.cz/denni-nabidka", Location.Poruba)
+async def sbeerka(dom, http):
+    REGEXP = re.compile(r"(?P<name>.*?)\s*(/[0-9,\s*]+/)?\s*(?P<price>[0-9]+\s*,-)")
+    t = None
+    for line in dom.css_first(".wysiwyg").text().splitlines():
+        line = line.strip()
+        if "Polévky" in line:
+            t = Soup
+        elif "Hlavní chody" in line:
+            t = Lunch
+        elif t and "Záloha" not in line:
+            m = REGEXP.search(line)
+            if m:
+                yield t(**m.groupdict())
+
+    PRICE_REGEXP = re.compile(r"([0-9]+)\s*,-")
+    response = await http.get("https://sbeerka.cz/aktualne-na-cepu", headers={"User-Agent": USER_AGENT})
+    dom = HTMLParser(response.text)
+    for beer in dom.css(".wysiwyg li"):
+        price = None
+        m = PRICE_REGEXP.search(beer.text())
+        if m:
+            price = m.group(0)
+        yield Lunch(name=beer.text(), price=price)
+
+
+@restaurant("Menza", "https://stravovani.vsb.cz/webkredit", Location.Poruba)
+async def menza(http):
+    date = datetime.datetime.now().replace(hour=22, minute=0, second=0, microsecond=0)
+    fdate = date.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3]
+
+    res = await http.get(f"https://stravovani.vsb.cz/webkredit/Api/Ordering/Menu?Dates={fdate}Z&CanteenId=1")
+    g = json.loads(res.text)["groups"]
+    if not g:
+        return
+
+    soup = g[0]["rows"][0]["item"]
+    yield Soup(soup["mealName"], soup["price"])
+
+    for lunch in g[1]["rows"]:
+        lunch = lunch["item"]
+        if lunch["price"] != 0:
+            yield Lunch(lunch["mealName"], lunch["price"])
@@ -0,0 +1,6 @@
+from lunches import Location, menicka_parser, restaurant
+
+
+@restaurant("Assen", "https://www.menicka.cz/api/iframe/?id=8767", Location.Zabreh)
+def assen(dom):
+    yield from menicka_parser(dom)
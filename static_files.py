@@ -0,0 +1,81 @@
+import gzip
+import hashlib
+import mimetypes
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import brotli
+from starlette.responses import Response
+
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# vite puts content hashes into the names of files in assets/, so they never change
+IMMUTABLE_DIR = "assets"
+
+
+@dataclass
+class StaticFile:
+    media_type: str
+    immutable: bool
+    # encoding -> (body, etag), identity is always present
+    variants: dict = field(default_factory=dict)
+
+    def add(self, encoding, body):
+        digest = hashlib.sha1(body).hexdigest()
+        self.variants[encoding] = (body, f'"{digest}"')
+
+
+def compress(body):
+    yield "gzip", gzip.compress(body, compresslevel=9, mtime=0)
+    yield "br", brotli.compress(body, quality=11)
+
+
+def load(directory):
+    """Reads the built frontend into memory together with its compressed variants."""
+    files = {}
+    directory = Path(directory)
+    if not directory.is_dir():
+        return files
+
+    for path in directory.rglob("*"):
+        if not path.is_file():
+            continue
+        name = path.relative_to(directory).as_posix()
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        body = path.read_bytes()
+        f = files[name] = StaticFile(media_type, name.startswith(f"{IMMUTABLE_DIR}/"))
+        f.add("identity", body)
+        if media_type.startswith(COMPRESSIBLE):
+            for encoding, compressed in compress(body):
+                if len(compressed) < len(body):
+                    f.add(encoding, compressed)
+    return files
+
+
+def accepted_encodings(header):
+    encodings = set()
+    for item in header.split(","):
+        encoding, _, params = item.partition(";")
+        params = params.replace(" ", "")
+        # only the explicit refusal matters, preferences between the accepted ones are ours
+        if params.startswith("q=") and params[2:].rstrip("0.") == "":
+            continue
+        if encoding.strip():
+            encodings.add(encoding.strip().lower())
+    return encodings
+
+
+def response(request, f):
+    accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+    encoding = next((e for e in ("br", "gzip") if e in f.variants and e in accepted), "identity")
+    body, etag = f.variants[encoding]
+
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "public, max-age=31536000, immutable" if f.immutable else "no-cache",
+    }
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=f.media_type, headers=headers)